@@ -4,8 +4,9 @@ from fastapi.responses import JSONResponse
 from sqlalchemy import text
 from app.db import engine
 from app.dictionary.loader import sync_inputs
+from app.pipeline.dict_repo import invalidate_dictionary, get_dictionary
 from typing import List
-import os, shutil, time
+import os, shutil
 from pathlib import Path
 
 router = APIRouter()  # prefixo /api vem do main.py
@@ -14,18 +15,28 @@ DATA_DIR = Path(os.getenv("DATA_DIR", "/data"))
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 @router.post("/dictionary/sync")
-def dictionary_sync(reindex: bool = True):
+def dictionary_sync(reindex: bool = True, rematch: bool = True):
     """
     Lê CSVs em /data, faz UPSERT nas tabelas e move cada arquivo para /data/input/loaded.
-    Opcionalmente reindexa o Meili ao final (reindex=True).
+    Opcionalmente reindexa o Meili (reindex=True), em background e só o delta.
+    Invalida o dicionário compilado e grava o snapshot da nova versão para os workers.
+    rematch=True enfileira o re-matching incremental (só sentenças afetadas pelo delta);
+    a própria task agenda o reindex quando muda alguma evidência.
     """
     sync = sync_inputs()
+    invalidate_dictionary()
+    dict_version = get_dictionary(force=True)["version"]
+    delta_task = None
+    if rematch:
+        from app.pipeline.tasks import apply_dictionary_delta
+        delta_task = apply_dictionary_delta.delay().id
     reidx = None
-    if reindex:
-        # reindex só se você quiser amarrar isso aqui; pode deixar False no frontend/CI
-        from app.search.indexer import index_all
-        reidx = index_all()
-    return JSONResponse({"ok": True, "sync": sync, "reindex": reidx})
+    if reindex and not rematch:
+        # com rematch o reindex vem depois do delta (senão indexaria evidências antigas)
+        from app.pipeline.tasks import reindex_meili
+        reidx = reindex_meili.delay("delta").id
+    return JSONResponse({"ok": True, "sync": sync, "dict_version": dict_version,
+                         "rematch_task_id": delta_task, "reindex": reidx})
 
 @router.get("/dictionary/stats")
 def dictionary_stats():
@@ -54,4 +65,4 @@ async def dictionary_upload(files: List[UploadFile] = File(...)):
         with dst.open("wb") as w:
             shutil.copyfileobj(f.file, w)
         saved.append(str(dst))
-    return {"ok": True, "saved": saved, "hint": "Agora chame POST /api/dictionary/sync"}
\ No newline at end of file
+    return {"ok": True, "saved": saved, "hint": "Agora chame POST /api/dictionary/sync"}
\ No newline at end of file
@@ -1,20 +1,30 @@
 # app/api/routes_search.py
 from fastapi import APIRouter, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
 from typing import Optional, List
-from meilisearch import Client
-import os, json, logging
+import json, logging
+
+from app.search import meili_client
+from app.search.cache import search_cache
 
 
 router = APIRouter()  # sem prefixo aqui; main aplica /api
 
-MEILI_URL = os.getenv("MEILI_URL", "http://meili:7700")
-MEILI_KEY = os.getenv("MEILI_MASTER_KEY")
 INDEX_NAME = "evidences"
 
-def get_client() -> Client:
-    return Client(MEILI_URL, MEILI_KEY)
+def _cache_key(kind: str, q: str, payload: dict) -> tuple:
+    return (kind, q, json.dumps(payload, sort_keys=True))
+
+def _cached_search(kind: str, q: str, payload: dict) -> dict:
+    """Busca pelo pool HTTP; respostas de sucesso ficam no cache até o índice mudar."""
+    key = _cache_key(kind, q, payload)
+    version, res = search_cache.get(key)
+    if res is None:
+        res = meili_client.search(INDEX_NAME, q, payload)
+        search_cache.put(key, res, version)
+    return res
 
 def _cap(n: Optional[int], lo: int = 1, hi: int = 200) -> int:
     """Clampa limites para evitar exageros/erros."""
@@ -34,6 +44,23 @@ def _build_filter(doc_name: Optional[str], concept_id: Optional[int], lang: Opti
         parts.append(f'lang = "{lang}"')
     return " AND ".join(parts) if parts else None
 
+def _hits_payload(doc_name, concept_id, lang, limit) -> dict:
+    return {
+        "limit": _cap(limit),
+        "filter": _build_filter(doc_name, concept_id, lang),
+        # opcional: highlight para mostrar <mark> no dashboard
+        "attributesToHighlight": ["snippet"],
+        "highlightPreTag": "<mark>",
+        "highlightPostTag": "</mark>",
+    }
+
+def _facets_payload(limit) -> dict:
+    return {
+        "limit": 0 if int(limit or 0) == 0 else _cap(limit),
+        "facets": ["doc_name", "concept_id", "lang"],
+        "attributesToRetrieve": [],
+    }
+
 @router.get("/search")
 @router.get("/search/")
 def search_evidences(
@@ -44,18 +71,9 @@ def search_evidences(
     limit: int = 20,
 ):
     try:
-        client = get_client()
-        filt = _build_filter(doc_name, concept_id, lang)
-        payload = {
-            "limit": _cap(limit),
-            "filter": filt,
-            # opcional: highlight para mostrar <mark> no dashboard
-            "attributesToHighlight": ["snippet"],
-            "highlightPreTag": "<mark>",
-            "highlightPostTag": "</mark>",
-        }
-        logging.info("Meili search | q=%r | filter=%r | limit=%d", q, filt, payload["limit"])
-        res = client.index(INDEX_NAME).search(q, payload)
+        payload = _hits_payload(doc_name, concept_id, lang, limit)
+        logging.info("Meili search | q=%r | filter=%r | limit=%d", q, payload["filter"], payload["limit"])
+        res = _cached_search("search", q, payload)
         return JSONResponse(content=jsonable_encoder(res))
     except Exception as e:
         logging.exception("search_evidences failed")
@@ -66,20 +84,57 @@ def search_evidences(
 def search_facets(q: str = "", limit: int = 0):
     """Retorna facetas; limit=0 evita hits."""
     try:
-        client = get_client()
-        payload = {
-            "limit": 0 if int(limit or 0) == 0 else _cap(limit),
-            "facets": ["doc_name", "concept_id", "lang"],
-            "attributesToRetrieve": [],
-        }
+        payload = _facets_payload(limit)
         logging.info("Meili facets | q=%r | limit=%s", q, payload["limit"])
-        res = client.index(INDEX_NAME).search(q, payload)
+        res = _cached_search("facets", q, payload)
         return JSONResponse(content=jsonable_encoder(res))
     except Exception as e:
         logging.exception("search_facets failed")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+@router.get("/search/combined")
+@router.get("/search/combined/")
+async def search_combined(
+    q: str = Query(..., description="Texto a buscar"),
+    doc_name: Optional[str] = None,
+    concept_id: Optional[int] = None,
+    lang: Optional[str] = None,
+    limit: int = 20,
+):
+    """
+    Hits (com filtros) + facetas (apenas por q) numa chamada: o que faltar no cache
+    vai ao Meili num único /multi-search, sem bloquear o worker da API.
+    """
+    try:
+        parts = {
+            "search": _hits_payload(doc_name, concept_id, lang, limit),
+            "facets": _facets_payload(0),
+        }
+        keys = {kind: _cache_key(kind, q, p) for kind, p in parts.items()}
+        # get() pode ler a versão do índice no Redis (cliente síncrono): fora do event loop
+        cached = await run_in_threadpool(lambda: {kind: search_cache.get(keys[kind]) for kind in parts})
+        out = {kind: res for kind, (_, res) in cached.items()}
+        todo = [kind for kind in parts if out[kind] is None]
+        if todo:
+            logging.info("Meili multi-search | q=%r | %s", q, ",".join(todo))
+            results = await meili_client.multi_search(
+                [{"indexUid": INDEX_NAME, "q": q, **parts[kind]} for kind in todo])
+            for kind, res in zip(todo, results):
+                res.pop("indexUid", None)  # mesmo formato de /search e /search/facets
+                search_cache.put(keys[kind], res, cached[kind][0])
+                out[kind] = res
+        return JSONResponse(content=jsonable_encoder(out))
+    except Exception as e:
+        logging.exception("search_combined failed")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+@router.get("/search/cache/stats")
+def search_cache_stats():
+    """Acertos/erros/despejos do cache de busca deste processo."""
+    return search_cache.stats()
+
 @router.post("/search/reindex")
-def reindex_all():
-    from app.search.indexer import index_all
-    return index_all()
+def reindex_all(mode: str = Query("delta", pattern="^(delta|full)$")):
+    """delta: só o que mudou desde a última indexação; full: rebuild num índice sombra + swap."""
+    from app.search.indexer import reindex
+    return reindex(mode)
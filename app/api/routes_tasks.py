@@ -1,5 +1,6 @@
 # app/api/routes_tasks.py
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
+from typing import Optional
 from celery.result import AsyncResult
 from app.pipeline.tasks import process_batch, process_doc, reindex_meili
 
@@ -11,11 +12,14 @@ def trigger_process_batch():
     return {"task_id": r.id}
 
 @router.post("/tasks/process_doc/{doc_id}")
-def trigger_process_doc(doc_id: int):
+def trigger_process_doc(doc_id: int, nlp_profile: Optional[str] = Query(None, pattern="^(full|fast|regex)$"),
+                        force: bool = Query(False)):
     """
     Dispara processamento do documento (V2 se PIPELINE_IMPL=v2).
+    nlp_profile opcional: full | fast | regex (default: NLP_PROFILE do worker).
+    force=true reprocessa mesmo se PDF, perfil e dicionário não mudaram.
     """
-    r = process_doc.delay(doc_id)
+    r = process_doc.delay(doc_id, nlp_profile=nlp_profile, force=force)
     return {"task_id": r.id, "doc_id": doc_id}
 
 @router.post("/tasks/reindex")
@@ -31,4 +35,4 @@ def task_status(task_id: str):
         payload["result"] = ar.result
     elif ar.failed():
         payload["error"] = str(ar.result)
-    return payload
\ No newline at end of file
+    return payload
\ No newline at end of file
@@ -2,9 +2,10 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from fastapi.responses import JSONResponse
 from pathlib import Path
-import hashlib, shutil, os, time
+import shutil, os, time
 from sqlalchemy import text
 from app.db import engine
+from app.pipeline.ocr import file_sha256
 
 router = APIRouter()
 
@@ -14,12 +15,15 @@ LOADED_DIR = INPUT_DIR / "loaded"
 INPUT_DIR.mkdir(parents=True, exist_ok=True)
 LOADED_DIR.mkdir(parents=True, exist_ok=True)
 
-def _sha256(p: Path) -> str:
-    h = hashlib.sha256()
-    with p.open("rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
+# PDF + formatos Office que a pipeline v2 extrai em processo (app.pipeline.office)
+ALLOWED_SUFFIXES = {".pdf", ".docx", ".odt", ".rtf", ".doc"}
+ALLOWED_TYPES = {   # tipo -> extensão usada quando o arquivo chega sem uma das permitidas
+    "application/pdf": ".pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ".docx",
+    "application/vnd.oasis.opendocument.text": ".odt",
+    "application/rtf": ".rtf", "text/rtf": ".rtf",
+    "application/msword": ".doc",
+}
 
 def _move_to_loaded(path: Path) -> Path:
     ts = time.strftime("%Y%m%d-%H%M%S")
@@ -29,18 +33,27 @@ def _move_to_loaded(path: Path) -> Path:
 
 @router.post("/upload/pdf")
 @router.post("/upload/pdf/")
+@router.post("/upload/document")
 async def upload_pdf(file: UploadFile = File(...), doc_name: str = Form(...), lang: str | None = Form(None)):
-    if file.content_type not in {"application/pdf"}:
-        raise HTTPException(415, f"Tipo inválido: {file.content_type}")
     safe = file.filename.replace("..", "_").replace("/", "_")
+    suffix = Path(safe).suffix.lower()
+    # navegador às vezes manda application/octet-stream: aí a extensão decide
+    if not (file.content_type in ALLOWED_TYPES
+            or (file.content_type == "application/octet-stream" and suffix in ALLOWED_SUFFIXES)):
+        raise HTTPException(415, f"Tipo inválido: {file.content_type} ({suffix or 'sem extensão'})")
+    if suffix not in ALLOWED_SUFFIXES:
+        safe += ALLOWED_TYPES[file.content_type]  # a pipeline escolhe o extrator pela extensão
     tmp = INPUT_DIR / safe
     with tmp.open("wb") as f:
         shutil.copyfileobj(file.file, f)
 
-    digest = _sha256(tmp)
+    digest = file_sha256(tmp)
 
     with engine.begin() as conn:
-        # UPSERT por sha256 (tabela 'documents' já criada por você)
+        prev = conn.execute(text("SELECT doc_name, lang FROM documents WHERE sha256 = :sha256 FOR UPDATE"),
+                            {"sha256": digest}).mappings().first()
+        # UPSERT por sha256 (tabela 'documents' já criada por você). Mesmo conteúdo com outro
+        # idioma refaz a extração; com outro doc_name (ou idioma), o casamento
         doc_id = conn.execute(text("""
             INSERT INTO documents (doc_name, file_path, sha256, lang, status)
             VALUES (:doc_name, :file_path, :sha256, :lang, 'uploaded')
@@ -48,10 +61,22 @@ async def upload_pdf(file: UploadFile = File(...), doc_name: str = Form(...), la
               SET doc_name = EXCLUDED.doc_name,
                   file_path = EXCLUDED.file_path,
                   lang      = COALESCE(EXCLUDED.lang, documents.lang),
+                  parsed_sha256 = CASE WHEN COALESCE(EXCLUDED.lang, documents.lang) IS DISTINCT FROM documents.lang
+                                       THEN NULL ELSE documents.parsed_sha256 END,
+                  matched_dict_version = CASE WHEN EXCLUDED.doc_name IS DISTINCT FROM documents.doc_name
+                                                OR COALESCE(EXCLUDED.lang, documents.lang) IS DISTINCT FROM documents.lang
+                                              THEN NULL ELSE documents.matched_dict_version END,
                   status    = 'uploaded',
                   updated_at = now()
             RETURNING id
         """), dict(doc_name=doc_name, file_path=str(tmp), sha256=digest, lang=lang)).scalar_one()
+        if prev and (prev["doc_name"] != doc_name or (lang is not None and prev["lang"] != lang)):
+            # evidências da análise anterior (nome/idioma antigos) saem; o reprocessamento refaz
+            conn.execute(text("""
+                DELETE FROM evidences e
+                WHERE e.doc_name = :old
+                  AND NOT EXISTS (SELECT 1 FROM documents d WHERE d.doc_name = :old AND d.id <> :id)
+            """), {"old": prev["doc_name"], "id": doc_id})
 
     final_path = _move_to_loaded(tmp)
     with engine.begin() as conn:
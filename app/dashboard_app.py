@@ -72,10 +72,11 @@ if do_search and q.strip():
         if s_concept_id: params["concept_id"] = int(s_concept_id)
         if s_lang:      params["lang"] = s_lang
 
-        # hits
-        r = requests.get(f"{API_URL}/api/search", params=params, timeout=10)
+        # hits + facets numa chamada só
+        r = requests.get(f"{API_URL}/api/search/combined", params=params, timeout=10)
         r.raise_for_status()
-        data = r.json()
+        combined = r.json()
+        data = combined.get("search", {})
         hits = data.get("hits", [])
 
         left, right = st.columns([2, 1])
@@ -111,9 +112,8 @@ if do_search and q.strip():
 
         # facets (apenas por q)
         with right:
-            fr = requests.get(f"{API_URL}/api/search/facets", params={"q": q.strip()}, timeout=10)
-            if fr.ok:
-                facets = fr.json().get("facetDistribution", {})
+            facets = (combined.get("facets") or {}).get("facetDistribution", {})
+            if facets:
                 st.subheader("Facets")
                 for fname in ("doc_name", "concept_id", "lang"):
                     dist = facets.get(fname)
@@ -1,5 +1,6 @@
 # app/db.py
-import os
+import hashlib, io, os
+from typing import Iterable, Sequence
 from sqlalchemy import create_engine, text
 
 # Usa DATABASE_URL se existir; caso contrário, monta a partir do compose
@@ -8,6 +9,9 @@ DATABASE_URL = os.getenv("DATABASE_URL") or \
 
 engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 
+EVIDENCE_COLUMNS = ("doc_name", "concept_id", "match_type", "level", "lang", "snippet",
+                    "pattern", "term_or_phrase", "rule_id", "score", "page", "method")
+
 def insert_evidences_df(df):
     """Insere em evidences com ON CONFLICT usando índice (doc_name, concept_id, md5(snippet))."""
     cols = ["doc_name","concept_id","match_type","level","lang","snippet","pattern","term_or_phrase"]
@@ -25,3 +29,62 @@ def insert_evidences_df(df):
     """)
     with engine.begin() as conn:
         conn.execute(sql, rows)
+
+def _csv_field(v) -> str:
+    # CSV do COPY: campo vazio sem aspas = NULL; texto sempre entre aspas
+    if v is None:
+        return ""
+    if isinstance(v, bool):
+        return "t" if v else "f"
+    if isinstance(v, (int, float)):
+        return repr(v)
+    return '"' + str(v).replace('"', '""') + '"'
+
+def copy_rows(conn, table: str, columns: Sequence[str], rows: Iterable[Sequence]) -> int:
+    """
+    COPY table (columns) FROM STDIN na transação de `conn` (Connection do SQLAlchemy).
+    `rows` são tuplas na ordem de `columns`; retorna quantas linhas foram enviadas.
+    """
+    buf = io.StringIO()
+    n = 0
+    for r in rows:
+        buf.write(",".join(_csv_field(v) for v in r))
+        buf.write("\n")
+        n += 1
+    if not n:
+        return 0
+    buf.seek(0)
+    cur = conn.connection.cursor()
+    try:
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cur.close()
+    return n
+
+def merge_evidences(conn, rows: list[tuple]) -> int:
+    """
+    COPY para uma tabela temporária + um INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+    Duplicatas (doc_name, concept_id, md5(snippet)) saem antes, em Python (fica a primeira).
+    Retorna quantas linhas entraram de fato em evidences.
+    """
+    seen, uniq = set(), []
+    for r in rows:
+        key = (r[0], r[1], hashlib.md5(r[5].encode("utf-8"), usedforsecurity=False).hexdigest())
+        if key not in seen:
+            seen.add(key)
+            uniq.append(r)
+    if not uniq:
+        return 0
+    cols = ", ".join(EVIDENCE_COLUMNS)
+    conn.execute(text(f"""
+        CREATE TEMP TABLE IF NOT EXISTS evidences_stage ON COMMIT DROP AS
+        SELECT {cols} FROM evidences WITH NO DATA
+    """))
+    copy_rows(conn, "evidences_stage", EVIDENCE_COLUMNS, uniq)
+    added = conn.execute(text(f"""
+        INSERT INTO evidences ({cols}, created_at)
+        SELECT {cols}, now() FROM evidences_stage
+        ON CONFLICT (doc_name, concept_id, md5(snippet)) DO NOTHING
+    """)).rowcount
+    conn.execute(text("TRUNCATE evidences_stage"))
+    return added
@@ -5,6 +5,7 @@ from app.api import routes_evidences, routes_tasks, routes_search, routes_docs
 from app.api.routes_dictionary import router as dictionary_router
 from app.api.routes_uploads import router as uploads_router
 from app.routers import api_vg_cc
+from app.search import meili_client
 
 app = FastAPI(title="Equiframe API")
 
@@ -16,6 +17,11 @@ app.include_router(dictionary_router,       prefix="/api")
 app.include_router(uploads_router,          prefix="/api")
 app.include_router(routes_docs.router,       prefix="/api")
 app.include_router(api_vg_cc.router)
+
+@app.on_event("shutdown")
+async def close_meili_pools():
+    await meili_client.aclose()
+
 class Health(BaseModel):
     status: str
 
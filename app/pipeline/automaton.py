@@ -0,0 +1,78 @@
+# app/pipeline/automaton.py
+from collections import deque
+from typing import Hashable, Iterable, Iterator, Sequence
+
+
+class AhoCorasick:
+    """
+    Autômato Aho-Corasick genérico: acha todas as ocorrências de N padrões numa
+    única passada sobre a sequência. Os símbolos podem ser caracteres (str) ou
+    tokens (list[str]), o que permite casar por palavra inteira.
+
+        ac = AhoCorasick()
+        ac.add(["direito", "à", "saúde"], 0)
+        ac.build()
+        ac.find_all("o direito à saúde é".split(" "))  # -> {0}
+    """
+
+    def __init__(self):
+        self._goto: list[dict] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list] = [[]]
+        self._built = False
+
+    def add(self, pattern: Sequence[Hashable], value) -> None:
+        """Registra um padrão (não vazio) com o valor devolvido nas ocorrências."""
+        if not pattern:
+            return
+        state = 0
+        for sym in pattern:
+            nxt = self._goto[state].get(sym)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][sym] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((len(pattern), value))
+        self._built = False
+
+    def build(self) -> "AhoCorasick":
+        """Calcula os links de falha (BFS) e propaga as saídas."""
+        goto, fail = self._goto, self._fail
+        emit = [list(o) for o in self._out]
+        queue = deque()
+        for nxt in goto[0].values():
+            fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            for sym, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and sym not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(sym, 0)
+                emit[nxt].extend(emit[fail[nxt]])
+        self._emit = emit
+        self._built = True
+        return self
+
+    def iter(self, seq: Iterable[Hashable]) -> Iterator[tuple[int, int, object]]:
+        """Gera (início, fim_exclusivo, valor) para cada ocorrência, inclusive sobrepostas."""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._emit
+        state = 0
+        for i, sym in enumerate(seq):
+            while state and sym not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(sym, 0)
+            if out[state]:
+                for length, value in out[state]:
+                    yield i + 1 - length, i + 1, value
+
+    def find_all(self, seq: Iterable[Hashable]) -> set:
+        """Conjunto dos valores cujos padrões ocorrem em `seq`."""
+        return {value for _, _, value in self.iter(seq)}
@@ -1,5 +1,6 @@
-import os
+import gc, logging, os, time
 from celery import Celery
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
 
 broker = os.getenv("REDIS_URL", "redis://redis:6379/0")
 backend = os.getenv("REDIS_URL", "redis://redis:6379/0")
@@ -20,6 +21,70 @@ app.conf.beat_schedule = {
     }
 }
 
+# -------- worker quente --------
+# Modelos spaCy e dicionário compilado são carregados uma vez no processo pai do
+# worker, antes do fork do prefork: os filhos herdam as páginas (copy-on-write)
+# em vez de cada um carregar tudo na primeira task. Só com PIPELINE_IMPL=v2.
+WORKER_PRELOAD = os.getenv("WORKER_PRELOAD", "true").lower() == "true"
+WORKER_PRELOAD_LANGS = [l.strip() for l in os.getenv("WORKER_PRELOAD_LANGS", "pt,en").split(",") if l.strip()]
+
+logger = logging.getLogger(__name__)
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def preload() -> dict:
+    """Carrega no processo atual o que as tasks da pipeline v2 usam. Retorna tempos (s)."""
+    from .nlp import NLP_PROFILE, get_nlp
+    from .dict_repo import get_dictionary
+    from . import semantic
+    timings = {}
+    for lang in WORKER_PRELOAD_LANGS:
+        t0 = time.perf_counter()
+        get_nlp(lang, NLP_PROFILE)
+        timings[f"nlp_{lang}_{NLP_PROFILE}"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    dct = get_dictionary()
+    timings["dictionary"] = time.perf_counter() - t0
+    if semantic.SEMANTIC_ENABLED:
+        t0 = time.perf_counter()
+        semantic.get_concept_index(dct)
+        timings["semantic"] = time.perf_counter() - t0
+    return timings
+
+@worker_init.connect
+def _preload_in_parent(**kwargs):
+    from .tasks import PIPELINE_IMPL
+    if not WORKER_PRELOAD or PIPELINE_IMPL != "v2":
+        return  # o piloto legado não usa os modelos nem o dicionário compilado
+    t0 = time.perf_counter()
+    try:
+        timings = preload()
+    except Exception:
+        logger.exception("worker preload falhou; filhos vão carregar sob demanda")
+        return
+    from app.db import engine
+    engine.dispose()  # conexões abertas no pai não podem ser herdadas pelos filhos
+    gc.freeze()       # objetos pré-carregados fora do GC: coleta nos filhos não suja as páginas
+    logger.info("worker preload %.2fs rss=%.0fMB | %s", time.perf_counter() - t0, _rss_mb(),
+                {k: round(v, 2) for k, v in timings.items()})
+
+@worker_process_init.connect
+def _child_init(**kwargs):
+    from app.db import engine
+    engine.dispose(close=False)  # descarta o pool herdado sem fechar sockets do pai
+    logger.info("worker child pid=%s rss=%.0fMB", os.getpid(), _rss_mb())
+
+@worker_process_shutdown.connect
+def _child_shutdown(**kwargs):
+    from .office import shutdown
+    shutdown()  # derruba o LibreOffice persistente deste filho junto com ele
+
 # Exemplo de tarefa rápida para teste
 @app.task
 def ping():
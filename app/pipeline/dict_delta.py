@@ -0,0 +1,278 @@
+# app/pipeline/dict_delta.py
+"""
+Re-matching incremental depois de um sync do dicionário.
+
+O conjunto de entradas já aplicado ao corpus fica em dictionary_entries_applied
+(md5 de cada linha de lexicon_terms/key_phrases/pattern_rules). O delta contra o
+estado atual diz o que entrou, mudou ou saiu; as sentenças que podem ter sido
+afetadas são achadas por filtros conservadores (LIKE/regex, acelerados pelos
+índices de trigramas de sentences.text / sentences.lemma_text) e só elas são
+casadas de novo. As evidências dessas
+sentenças são reconciliadas: sai o que não casa mais (ou mudou), entra o novo.
+"""
+import os, re, time
+from functools import lru_cache
+
+from sqlalchemy import bindparam, text
+from app.db import engine, copy_rows, merge_evidences
+
+from .dict_repo import dictionary_version, get_dictionary, invalidate_dictionary
+from .fuzzy import TrigramIndex, trigrams
+from .matcher import FUZZY_CUTOFF, FUZZY_MODE
+from .rules import fold, required_factors
+from .v2 import evidence_row, match_sentences, snippet_md5
+from . import semantic
+
+DELTA_BATCH_SIZE = int(os.getenv("DELTA_BATCH_SIZE", "2000"))   # sentenças re-casadas por lote
+DELTA_ATTEMPTS = 3   # recargas se o dicionário mudar entre a compilação e o snapshot do delta
+
+ENTRY_COLUMNS = ("kind", "entry_key", "entry_md5", "lang", "value", "lemma")
+
+SQL_ENTRIES = text("""
+    SELECT 'term' AS kind, concat_ws('|', t.concept_id, lower(t.lang), t.term) AS entry_key,
+           md5(t::text) AS entry_md5, lower(t.lang) AS lang, t.term AS value,
+           COALESCE(t.lemma, t.term) AS lemma
+    FROM lexicon_terms t
+    UNION ALL
+    SELECT 'phrase', concat_ws('|', k.concept_id, lower(k.lang), k.phrase),
+           md5(k::text), lower(k.lang), k.phrase, NULL
+    FROM key_phrases k
+    UNION ALL
+    SELECT 'rule', r.id::text, md5(r::text), lower(r.lang), r.pattern, NULL
+    FROM pattern_rules r
+""")
+
+SQL_SENTENCES = text("""
+    SELECT s.id, s.doc_id, s.page, s.text, s.lemma_text, d.doc_name, d.lang
+    FROM sentences s JOIN documents d ON d.id = s.doc_id
+    WHERE s.id IN :ids
+    ORDER BY s.doc_id, s.page, s.sent_idx
+""").bindparams(bindparam("ids", expanding=True))
+
+SQL_EXISTING = text("""
+    SELECT id, concept_id, md5(snippet) AS h, level, pattern, term_or_phrase, rule_id, score, method
+    FROM evidences
+    WHERE doc_name = :doc_name AND md5(snippet) IN :hashes
+""").bindparams(bindparam("hashes", expanding=True))
+
+SQL_DELETE = text("DELETE FROM evidences WHERE id IN :ids").bindparams(bindparam("ids", expanding=True))
+
+def _like(s: str) -> str:
+    return "%" + s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def _norm_lang(l):
+    return (l or "").lower() or None
+
+def current_entries(conn) -> dict:
+    """{entry_md5: entry} do dicionário atual."""
+    return {r["entry_md5"]: dict(r) for r in conn.execute(SQL_ENTRIES).mappings()}
+
+def applied_entries(conn) -> dict | None:
+    """{entry_md5: entry} já aplicado ao corpus; None se nunca houve linha de base."""
+    version = conn.execute(text("SELECT version FROM dictionary_sync_state WHERE id = 1")).scalar()
+    if version is None:
+        return None
+    rows = conn.execute(text(f"SELECT {', '.join(ENTRY_COLUMNS)} FROM dictionary_entries_applied")).mappings()
+    return {r["entry_md5"]: dict(r) for r in rows}
+
+def diff_entries(old: dict, new: dict) -> dict:
+    """added/changed/removed pela chave natural (conceito+idioma+termo/frase, id da regra)."""
+    gone = [e for h, e in old.items() if h not in new]
+    came = [e for h, e in new.items() if h not in old]
+    gone_keys = {(e["kind"], e["entry_key"]) for e in gone}
+    came_keys = {(e["kind"], e["entry_key"]) for e in came}
+    return {
+        "added":   [e for e in came if (e["kind"], e["entry_key"]) not in gone_keys],
+        "changed": [e for e in came if (e["kind"], e["entry_key"]) in gone_keys],
+        "removed": [e for e in gone if (e["kind"], e["entry_key"]) not in came_keys],
+        # o que sai também precisa ser procurado (evidências antigas)
+        "touched": came + gone,
+    }
+
+@lru_cache(maxsize=2)
+def _preimages(kind: str) -> tuple[dict, dict]:
+    """
+    Inverso da normalização do matcher (str.lower para termos/frases, rules.fold para
+    regras): {c: caracteres x com norm(x) == c} e {c: caracteres x cuja norm(x) tem
+    mais de um caractere, entre eles c} (ß -> ss, İ -> i̇, ligaturas...).
+    """
+    norm = str.lower if kind == "lower" else fold
+    single, multi = {}, {}
+    for cp in range(0x110000):
+        if 0xD800 <= cp <= 0xDFFF:
+            continue
+        x = chr(cp)
+        n = norm(x)
+        if n == x:
+            continue  # o próprio caractere entra sempre na classe
+        if len(n) == 1:
+            single.setdefault(n, set()).add(x)
+        else:
+            for c in n:
+                multi.setdefault(c, set()).add(x)
+    return single, multi
+
+def _pg_chars(chars) -> str:
+    return "".join(x if x.isascii() and x.isalnum() else
+                   (f"\\u{ord(x):04x}" if ord(x) <= 0xFFFF else f"\\U{ord(x):08x}")
+                   for x in sorted(chars))
+
+def containment_regex(needle: str, kind: str) -> str:
+    """
+    Regex do Postgres que casa todo texto t com needle in norm(t) (e talvez mais alguns):
+    cada caractere vira a classe das suas pré-imagens; se a ocorrência passar por um
+    caractere que a normalização expande, o texto contém esse caractere (segunda alternativa).
+    Sem depender de lower()/ILIKE do banco, que seguem o locale e não fazem casefold.
+    """
+    single, multi = _preimages(kind)
+    seq = "".join("[" + _pg_chars(single.get(c, set()) | {c}) + "]" for c in needle)
+    extra = set().union(*(multi.get(c, set()) for c in set(needle)))
+    return f"{seq}|[{_pg_chars(extra)}]" if extra else seq
+
+def _fuzzy_filter(term: str) -> tuple[str, dict] | None:
+    """
+    Sentenças onde partial_ratio(term, texto) >= FUZZY_CUTOFF é possível: a mesma conta
+    do TrigramIndex do matcher (trigramas em comum >= need, ou texto mais curto que o
+    termo). None quando o limite não filtra nada (termos curtos).
+    """
+    index = TrigramIndex([term], FUZZY_CUTOFF)
+    need = index.need[0]
+    if need <= 0:
+        return None
+    grams = sorted(trigrams(term))
+    params = {f"g{i}": containment_regex(g, "lower") for i, g in enumerate(grams)}
+    params["gany"] = "|".join(f"(?:{rx})" for rx in params.values())
+    count = " + ".join(f"(s.text ~ :g{i})::int" for i in range(len(grams)))
+    cond = f"((s.text ~ :gany AND ({count}) >= {need}) OR char_length(s.text) < {len(term)})"
+    return cond, params
+
+def _entry_filter(e: dict) -> tuple[str, dict] | None:
+    """
+    Condição SQL sobre sentences (s) que cobre toda sentença onde a entrada pode casar
+    (superconjunto do que o matcher acharia). None = não há filtro seguro: todas as
+    sentenças do idioma.
+    """
+    v = e["value"] or ""
+    if e["kind"] == "term":
+        # termos casam por token no lemma_text, que já é gravado em minúsculas (str.lower)
+        cond = "s.lemma_text LIKE :lemma"
+        params = {"lemma": _like((e["lemma"] or v).lower())}
+        if FUZZY_MODE != "exact":
+            fz = _fuzzy_filter(v.lower())
+            if fz is None:
+                return None
+            cond = f"({cond} OR {fz[0]})"
+            params.update(fz[1])
+        return cond, params
+    if e["kind"] == "phrase":
+        return "s.text ~ :phrase", {"phrase": containment_regex(v.lower(), "lower")}
+    try:
+        factors = required_factors(re.compile(v, flags=re.I | re.M))
+    except re.error:
+        return "FALSE", {}  # regra inválida não compila no dicionário: nunca casa
+    if factors is None:
+        return None  # regra sem literal obrigatório
+    params = {f"f{i}": containment_regex(f, "fold") for i, f in enumerate(sorted(factors))}
+    return "(" + " OR ".join(f"s.text ~ :{k}" for k in params) + ")", params
+
+def affected_sentences(conn, entries: list[dict]) -> set[int]:
+    ids = set()
+    for e in entries:
+        cond, params = _entry_filter(e) or ("TRUE", {})
+        lang = _norm_lang(e["lang"])
+        if lang is not None:
+            cond += " AND lower(COALESCE(s.lang, 'en')) = :lang"
+            params["lang"] = lang
+        ids.update(conn.execute(text(f"SELECT s.id FROM sentences s WHERE {cond}"), params).scalars())
+    return ids
+
+def _same(old, row: tuple) -> bool:
+    score = None if old["score"] is None else round(float(old["score"]), 6)
+    new_score = None if row[9] is None else round(row[9], 6)
+    return (old["level"], old["pattern"], old["term_or_phrase"], old["rule_id"], score, old["method"]) == \
+           (row[3], row[6], row[7], row[8], new_score, row[11])
+
+def rematch_sentences(conn, sents: list[dict], dct) -> tuple[int, int]:
+    """Re-casa sentenças de um documento e reconcilia suas evidências. (adicionadas, removidas)"""
+    doc = {"doc_name": sents[0]["doc_name"], "lang": sents[0]["lang"]}
+    by_sent = match_sentences(sents, doc["lang"] or "en", dct)
+    new = {}
+    for s in sents:
+        for m in by_sent[s["id"]]:
+            row = evidence_row(doc, s, m)
+            new.setdefault((row[1], snippet_md5(row[5])), row)
+
+    hashes = list({snippet_md5(s["text"]) for s in sents})
+    keep, stale = set(), []
+    for old in conn.execute(SQL_EXISTING, {"doc_name": doc["doc_name"], "hashes": hashes}).mappings():
+        if old["method"] == "semantic" and not semantic.SEMANTIC_ENABLED:
+            continue  # estágio desligado agora: não apaga o que ele achou antes
+        key = (old["concept_id"], old["h"])
+        if key in new and _same(old, new[key]):
+            keep.add(key)
+        else:
+            stale.append(old["id"])
+    if stale:
+        conn.execute(SQL_DELETE, {"ids": stale})
+    added = merge_evidences(conn, [r for k, r in new.items() if k not in keep])
+    return added, len(stale)
+
+def _save_applied(conn, entries: dict, version: str) -> None:
+    conn.execute(text("DELETE FROM dictionary_entries_applied"))
+    copy_rows(conn, "dictionary_entries_applied", ENTRY_COLUMNS,
+              ([e[c] for c in ENTRY_COLUMNS] for e in entries.values()))
+    conn.execute(text("""
+        INSERT INTO dictionary_sync_state (id, version, applied_at) VALUES (1, :v, now())
+        ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version, applied_at = EXCLUDED.applied_at
+    """), {"v": version})
+
+def _apply(conn, dct, t0: float) -> dict:
+    prev_version = conn.execute(text("SELECT version FROM dictionary_sync_state WHERE id = 1")).scalar()
+    new = current_entries(conn)
+    old = applied_entries(conn)
+    if old is None:
+        _save_applied(conn, new, dct["version"])
+        return {"baseline": True, "to_version": dct["version"], "entries": len(new)}
+
+    delta = diff_entries(old, new)
+    ids = sorted(affected_sentences(conn, delta["touched"]))
+    added = removed = 0
+    for i in range(0, len(ids), DELTA_BATCH_SIZE):
+        rows = [dict(r) for r in conn.execute(SQL_SENTENCES, {"ids": ids[i:i + DELTA_BATCH_SIZE]}).mappings()]
+        by_doc = {}
+        for r in rows:
+            by_doc.setdefault(r["doc_id"], []).append(r)
+        for sents in by_doc.values():
+            a, r = rematch_sentences(conn, sents, dct)
+            added += a
+            removed += r
+
+    _save_applied(conn, new, dct["version"])
+    # documentos casados com a versão anterior agora estão em dia com a nova
+    conn.execute(text("""
+        UPDATE documents SET matched_dict_version = :new WHERE matched_dict_version = :old
+    """), {"new": dct["version"], "old": prev_version})
+
+    return {
+        "from_version": prev_version, "to_version": dct["version"],
+        "added": len(delta["added"]), "changed": len(delta["changed"]), "removed": len(delta["removed"]),
+        "sentences": len(ids), "evidences_added": added, "evidences_removed": removed,
+        "seconds": round(time.monotonic() - t0, 3),
+    }
+
+def apply_dictionary_delta() -> dict:
+    """
+    Aplica ao corpus só o que mudou no dicionário desde a última execução.
+    Na primeira vez apenas grava a linha de base (o corpus é tido como casado com ela).
+    O delta roda num snapshot REPEATABLE READ cuja versão publicada tem de ser a do
+    dicionário compilado; se o dicionário mudou no meio, recarrega e tenta de novo.
+    """
+    t0 = time.monotonic()
+    invalidate_dictionary()
+    for _ in range(DELTA_ATTEMPTS):
+        dct = get_dictionary(force=True)
+        with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn, conn.begin():
+            if dictionary_version(conn) != dct["version"]:
+                continue
+            return _apply(conn, dct, t0)
+    raise RuntimeError(f"dicionário mudou durante {DELTA_ATTEMPTS} tentativas de delta")
@@ -1,9 +1,32 @@
+import os, pickle, threading, time
+from pathlib import Path
 from sqlalchemy import text
 from app.db import engine
 
+# snapshot compilado do dicionário (memória + arquivo local para workers recém-forkados)
+DICT_CACHE_DIR = Path(os.getenv("DICT_CACHE_DIR", "/data/cache/dictionary"))
+DICT_CACHE_PERSIST = os.getenv("DICT_CACHE_PERSIST", "true").lower() == "true"
+DICT_VERSION_TTL = float(os.getenv("DICT_VERSION_TTL", "0"))  # segundos entre checagens de versão (0 = toda chamada)
+
+# versão = md5 do conteúdo das três tabelas, publicada em dictionary_version por trigger
+# a cada escrita (ef_schema_pipeline.sql); checar é ler uma linha
+SQL_DICT_VERSION = text("SELECT version FROM dictionary_version WHERE id = 1")
+
+_cache = {"dct": None, "checked_at": 0.0, "stale": False}
+_lock = threading.Lock()
+
+def dictionary_version(conn=None) -> str:
+    """Hash publicado do conteúdo de lexicon_terms/key_phrases/pattern_rules."""
+    if conn is not None:
+        return conn.execute(SQL_DICT_VERSION).scalar_one()
+    with engine.begin() as conn:
+        return conn.execute(SQL_DICT_VERSION).scalar_one()
+
 def load_dictionary():
     """Carrega dicionário do Postgres em estruturas rápidas."""
-    with engine.begin() as conn:
+    # versão e tabelas no mesmo snapshot: o dicionário carregado é exatamente o da versão
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn, conn.begin():
+        version = dictionary_version(conn)
         # termos
         lt = conn.execute(text("""
             SELECT concept_id, lang, term, COALESCE(lemma, term) AS lemma,
@@ -28,12 +51,12 @@ def load_dictionary():
     terms_by_lang = {}
     for r in lt:
         lang = norm_lang(r["lang"])
-        terms_by_lang.setdefault(lang, []).append(r)
+        terms_by_lang.setdefault(lang, []).append(dict(r))
 
     phrases_by_lang = {}
     for r in kp:
         lang = norm_lang(r["lang"])
-        phrases_by_lang.setdefault(lang, []).append(r)
+        phrases_by_lang.setdefault(lang, []).append(dict(r))
 
     import re
     rules_by_lang = {}
@@ -47,7 +70,85 @@ def load_dictionary():
         })
 
     return {
+        "version": version,
         "terms_by_lang": terms_by_lang,
         "phrases_by_lang": phrases_by_lang,
         "rules_by_lang": rules_by_lang,
     }
+
+def compile_dictionary(dct) -> dict:
+    """Pré-compila os matchers de todos os idiomas (autômatos, índice fuzzy, RuleSet)."""
+    from .matcher import FUZZY_CUTOFF, get_compiled
+    langs = set(dct["terms_by_lang"]) | set(dct["phrases_by_lang"]) | set(dct["rules_by_lang"])
+    for lang in langs:
+        get_compiled(dct, lang)
+    dct["fuzzy_cutoff"] = FUZZY_CUTOFF
+    return dct
+
+# -------- snapshot em arquivo --------
+def _snapshot_path(version: str) -> Path:
+    return DICT_CACHE_DIR / f"dictionary-{version}.pkl"
+
+def _read_snapshot(version: str):
+    """Lê o snapshot da versão pedida; None se não houver."""
+    if not DICT_CACHE_PERSIST:
+        return None
+    try:
+        with _snapshot_path(version).open("rb") as f:
+            dct = pickle.load(f)
+    except Exception:
+        return None
+    from .matcher import FUZZY_CUTOFF
+    if dct.get("fuzzy_cutoff") != FUZZY_CUTOFF:
+        dct.pop("compiled_by_lang", None)
+        compile_dictionary(dct)
+    return dct
+
+def _write_snapshot(dct) -> None:
+    if not DICT_CACHE_PERSIST:
+        return
+    try:
+        DICT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        path = _snapshot_path(dct["version"])
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp.open("wb") as f:
+            pickle.dump(dct, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # cache em disco é só otimização
+
+# -------- cache em processo --------
+def get_dictionary(force: bool = False) -> dict:
+    """
+    Dicionário compilado, compartilhado pelas tasks do processo.
+
+    - em memória: reaproveitado enquanto a versão publicada não muda (uma linha lida a
+      cada chamada, ou a cada DICT_VERSION_TTL s);
+    - em disco: um worker recém-iniciado carrega o snapshot da versão publicada sem
+      reler as tabelas;
+    - force=True (ou invalidate_dictionary) obriga a checar a versão já.
+    """
+    with _lock:
+        now = time.monotonic()
+        dct = _cache["dct"]
+        force = force or _cache["stale"]
+        if dct is not None and not force and now - _cache["checked_at"] < DICT_VERSION_TTL:
+            return dct
+
+        version = dictionary_version()
+        if dct is None or dct["version"] != version:
+            dct = _read_snapshot(version)
+            if dct is None:
+                # a versão pode ter mudado de novo entre a checagem e a carga: vale a carregada
+                dct = compile_dictionary(load_dictionary())
+                _write_snapshot(dct)
+        _cache.update(dct=dct, checked_at=now, stale=False)
+        return dct
+
+def invalidate_dictionary() -> None:
+    """
+    Faz a próxima get_dictionary() deste processo checar a versão já, mesmo com
+    DICT_VERSION_TTL > 0. Os outros processos veem a nova versão pela linha publicada.
+    """
+    with _lock:
+        _cache["stale"] = True
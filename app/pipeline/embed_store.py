@@ -0,0 +1,66 @@
+# app/pipeline/embed_store.py
+"""
+Cache persistente de embeddings de sentenças no Postgres (tabela sentence_embeddings).
+
+Chave: (modelo, md5 do texto normalizado). Quem precisa de vetores chama
+get_vectors(): busca em lote o que já existe e só codifica as faltas.
+"""
+import hashlib, os, unicodedata
+
+from sqlalchemy import bindparam, text
+from app.db import engine
+
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+EMBED_FETCH_CHUNK = int(os.getenv("EMBED_FETCH_CHUNK", "5000"))     # hashes por SELECT
+EMBED_ENCODE_CHUNK = int(os.getenv("EMBED_ENCODE_CHUNK", "4096"))   # textos por lote de encode/INSERT
+
+SQL_FETCH = text("""
+    SELECT text_md5, vec FROM sentence_embeddings
+    WHERE model = :model AND text_md5 IN :hashes
+""").bindparams(bindparam("hashes", expanding=True))
+
+SQL_INSERT = text("""
+    INSERT INTO sentence_embeddings (model, text_md5, dim, vec)
+    VALUES (:model, :text_md5, :dim, :vec)
+    ON CONFLICT (model, text_md5) DO NOTHING
+""")
+
+def normalize(s: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", s or "").split())
+
+def text_md5(s: str) -> str:
+    return hashlib.md5(normalize(s).encode("utf-8"), usedforsecurity=False).hexdigest()
+
+def get_vectors(texts: list[str], model: str, encode_fn):
+    """
+    Matriz (len(texts), dim) float32 na ordem de `texts`.
+    encode_fn(list[str]) -> np.ndarray só é chamado para os textos ausentes do cache.
+    """
+    import numpy as np
+    if not EMBED_CACHE_ENABLED or not texts:
+        return encode_fn([normalize(t) for t in texts])
+
+    hashes = [text_md5(t) for t in texts]
+    first = {}  # hash -> primeiro texto com esse hash
+    for h, t in zip(hashes, texts):
+        first.setdefault(h, t)
+
+    found = {}
+    uniq = list(first)
+    with engine.begin() as conn:
+        for i in range(0, len(uniq), EMBED_FETCH_CHUNK):
+            for h, vec in conn.execute(SQL_FETCH, {"model": model, "hashes": uniq[i:i + EMBED_FETCH_CHUNK]}):
+                found[h] = np.frombuffer(bytes(vec), dtype="float32")
+
+    misses = [h for h in uniq if h not in found]
+    for i in range(0, len(misses), EMBED_ENCODE_CHUNK):
+        chunk = misses[i:i + EMBED_ENCODE_CHUNK]
+        vecs = np.asarray(encode_fn([normalize(first[h]) for h in chunk]), dtype="float32")
+        rows = []
+        for h, v in zip(chunk, vecs):
+            found[h] = v
+            rows.append({"model": model, "text_md5": h, "dim": int(v.shape[0]), "vec": v.tobytes()})
+        with engine.begin() as conn:
+            conn.execute(SQL_INSERT, rows)
+
+    return np.stack([found[h] for h in hashes]).astype("float32", copy=False)
@@ -0,0 +1,77 @@
+# app/pipeline/fuzzy.py
+from collections import Counter
+from math import floor
+
+from rapidfuzz import fuzz, process
+
+
+def trigrams(s: str) -> set[str]:
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class TrigramIndex:
+    """
+    Índice invertido de trigramas sobre os termos do dicionário (já em minúsculas).
+
+    Serve de pré-filtro sem perda para fuzz.partial_ratio(term, text) >= cutoff:
+    se algum trecho do texto tem ratio >= cutoff, a distância de edição até o termo
+    é no máximo d = (1 - cutoff/100) * 2 * len(term), e cada edição destrói no máximo
+    3 trigramas. Logo o termo divide pelo menos  |trigramas(term)| - 3d  trigramas com
+    o texto. Termos cujo limite é <= 0 (curtos) são sempre pontuados.
+    """
+
+    def __init__(self, terms: list[str], cutoff: float = 90):
+        self.terms = terms
+        self.cutoff = cutoff
+        self.postings: dict[str, list[int]] = {}
+        self.need: list[int] = []
+        self.always: list[int] = []
+        for i, t in enumerate(terms):
+            grams = trigrams(t)
+            max_edits = floor((1 - cutoff / 100) * 2 * len(t) + 1e-9)
+            need = len(grams) - 3 * max_edits
+            self.need.append(need)
+            if need <= 0:
+                self.always.append(i)
+                continue
+            for g in grams:
+                self.postings.setdefault(g, []).append(i)
+        # partial_ratio inverte os papéis quando o texto é mais curto que o termo
+        self.by_len = sorted(range(len(terms)), key=lambda i: len(terms[i]), reverse=True)
+
+    def candidates(self, text: str) -> set[int]:
+        """Índices dos termos que ainda podem atingir o cutoff em `text`."""
+        counts = Counter()
+        postings = self.postings
+        for g in trigrams(text):
+            p = postings.get(g)
+            if p:
+                counts.update(p)
+        need = self.need
+        out = {i for i, c in counts.items() if c >= need[i]}
+        out.update(self.always)
+        n = len(text)
+        for i in self.by_len:
+            if len(self.terms[i]) <= n:
+                break
+            out.add(i)
+        return out
+
+    def score(self, text: str, idxs) -> set[int]:
+        """Pontua os candidatos num único cdist com score_cutoff; devolve os que passam."""
+        idxs = sorted(idxs)
+        if not idxs:
+            return set()
+        scores = process.cdist(
+            [self.terms[i] for i in idxs], [text],
+            scorer=fuzz.partial_ratio, processor=None, score_cutoff=self.cutoff,
+        )
+        return {i for i, s in zip(idxs, scores[:, 0]) if s > 0}
+
+    def search(self, text: str, skip=()) -> set[int]:
+        """Termos com partial_ratio >= cutoff, via índice; `skip` já casou por lema."""
+        return self.score(text, self.candidates(text).difference(skip))
+
+    def scan(self, text: str, skip=()) -> set[int]:
+        """Mesmo resultado de search(), mas pontuando todos os termos (sem índice)."""
+        return self.score(text, set(range(len(self.terms))).difference(skip))
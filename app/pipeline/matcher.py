@@ -1,69 +1,177 @@
-from rapidfuzz import fuzz
-import re
+import os
+from bisect import bisect_right
 from typing import Optional
 
+from .automaton import AhoCorasick
+from .fuzzy import TrigramIndex
+from .rules import RuleSet
+
 LEVEL_MAP = {"mention":1, "promise":2, "action":3, "monitor":4, "negation":1}
 
-def match_sentence(sent_text: str, lemma_text: str, lang: str, dct) -> list[dict]:
+# fallback fuzzy dos termos: 'exact' (desliga), 'indexed' (trigramas, default) ou 'full' (todos os termos)
+FUZZY_MODES = ("exact", "indexed", "full")
+FUZZY_MODE = os.getenv("MATCH_FUZZY_MODE", "indexed").lower()
+FUZZY_CUTOFF = float(os.getenv("MATCH_FUZZY_CUTOFF", "90"))
+
+# separador entre sentenças no fluxo de tokens de match_document (nunca casa com um termo)
+_SEP = object()
+
+def compile_lang(terms: list, kps: list, rules: list) -> dict:
+    """
+    Compila os autômatos de um idioma:
+      - termos: por token sobre o lemma_text (equivale a f" {lemma} " in f" {lemma_text} ")
+      - frases: por caractere sobre o texto minúsculo (equivale a phrase in text_l)
+      - fuzzy: índice de trigramas sobre os termos (fallback partial_ratio)
+      - regras: RuleSet (pré-filtro de literais + confirmação só das candidatas)
+    Os valores são os índices nas listas originais, para preservar a ordem de saída.
+    """
+    term_ac = AhoCorasick()
+    for i, r in enumerate(terms):
+        term_ac.add(r["lemma"].lower().split(" "), i)
+    phrase_ac = AhoCorasick()
+    for i, r in enumerate(kps):
+        phrase_ac.add(r["phrase"].lower(), i)
+    fuzzy = TrigramIndex([r["term"].lower() for r in terms], FUZZY_CUTOFF)
+    return {"terms": term_ac.build(), "phrases": phrase_ac.build(), "fuzzy": fuzzy,
+            "rules": RuleSet(rules)}
+
+def get_compiled(dct, lang: Optional[str]) -> dict:
+    """Autômatos do idioma, compilados uma vez e guardados no próprio dicionário."""
+    cache = dct.setdefault("compiled_by_lang", {})
+    comp = cache.get(lang)
+    if comp is None:
+        comp = cache[lang] = compile_lang(
+            dct["terms_by_lang"].get(lang, []),
+            dct["phrases_by_lang"].get(lang, []),
+            dct["rules_by_lang"].get(lang, []),
+        )
+    return comp
+
+def _fuzzy_mode(fuzzy_mode: Optional[str]) -> str:
+    fuzzy_mode = (fuzzy_mode or FUZZY_MODE).lower()
+    if fuzzy_mode not in FUZZY_MODES:
+        raise ValueError(f"fuzzy_mode inválido: {fuzzy_mode}")
+    return fuzzy_mode
+
+def match_sentence(sent_text: str, lemma_text: str, lang: str, dct,
+                   fuzzy_mode: Optional[str] = None) -> list[dict]:
     """
     Retorna lista de evidences candidates:
     {concept_id, level, rule_id, pattern_str, term_or_phrase, score, method}
+    fuzzy_mode sobrepõe MATCH_FUZZY_MODE (exact | indexed | full).
     """
-    out = []
+    fuzzy_mode = _fuzzy_mode(fuzzy_mode)
     lang = (lang or "").lower() or None
+    comp = get_compiled(dct, lang)
+    text_l = sent_text.lower()
+    return _match(dct, lang, comp, sent_text, text_l,
+                  comp["terms"].find_all(lemma_text.split(" ")),
+                  comp["phrases"].find_all(text_l), fuzzy_mode)
+
+def match_document(sentences, lang: str, dct, fuzzy_mode: Optional[str] = None) -> dict:
+    """
+    Versão em lote de match_sentence para um documento inteiro.
+
+    `sentences`: iterável de {'id', 'text', 'lemma_text'}. Os lemas (por token) e os
+    textos (por caractere) de todas as sentenças são concatenados e varridos uma única
+    vez pelos autômatos; cada ocorrência volta à sua sentença por uma tabela de offsets
+    (ocorrências que atravessam a fronteira entre sentenças são descartadas).
+    Retorna {sentence_id: [matches]} com a mesma agregação de match_sentence.
+    """
+    fuzzy_mode = _fuzzy_mode(fuzzy_mode)
+    lang = (lang or "").lower() or None
+    comp = get_compiled(dct, lang)
+
+    ids, texts, texts_l = [], [], []
+    tokens, tok_off = [], []
+    chars_off, pos = [], 0
+    for s in sentences:
+        ids.append(s["id"])
+        texts.append(s["text"])
+        text_l = s["text"].lower()
+        texts_l.append(text_l)
+        tok_off.append(len(tokens))
+        tokens.extend((s["lemma_text"] or "").split(" "))
+        tokens.append(_SEP)
+        chars_off.append(pos)
+        pos += len(text_l) + 1
+    tok_off.append(len(tokens))
+    chars_off.append(pos)
+
+    term_hits = [set() for _ in ids]
+    for start, end, i in comp["terms"].iter(tokens):
+        k = bisect_right(tok_off, start) - 1
+        if end < tok_off[k + 1]:
+            term_hits[k].add(i)
+    phrase_hits = [set() for _ in ids]
+    for start, end, i in comp["phrases"].iter("\x00".join(texts_l)):
+        k = bisect_right(chars_off, start) - 1
+        if end < chars_off[k + 1]:
+            phrase_hits[k].add(i)
+
+    return {
+        sid: _match(dct, lang, comp, texts[k], texts_l[k], term_hits[k], phrase_hits[k], fuzzy_mode)
+        for k, sid in enumerate(ids)
+    }
+
+def _match(dct, lang, comp, sent_text: str, text_l: str, hits: set, phrase_hits: set,
+           fuzzy_mode: str) -> list[dict]:
+    """Monta e agrega as candidatas de uma sentença a partir dos hits dos autômatos."""
+    out = []
     terms = dct["terms_by_lang"].get(lang, [])
     kps   = dct["phrases_by_lang"].get(lang, [])
     rules = dct["rules_by_lang"].get(lang, [])
 
-    text_l = sent_text.lower()
-
     # 1) Lexicon terms by lemma exact-ish
-    for r in terms:
-        # exato no lemma_text (rápido) + fallback fuzzy leve no texto bruto
-        hit = (f" {r['lemma'].lower()} " in f" {lemma_text} ") or \
-              (fuzz.partial_ratio(r["term"].lower(), text_l) >= 90)
-        if hit:
-            out.append({
-                "concept_id": r["concept_id"],
-                "level": 1,
-                "rule_id": None,
-                "pattern_str": None,
-                "term_or_phrase": r["term"],
-                "score": 0.5 * r["weight"] + 0.1 * r["priority"],
-                "method": "lexical"
-            })
+    # exato no lemma_text (autômato) + fallback fuzzy leve no texto bruto
+    hits = set(hits)
+    if fuzzy_mode == "indexed":
+        hits |= comp["fuzzy"].search(text_l, skip=hits)
+    elif fuzzy_mode == "full":
+        hits |= comp["fuzzy"].scan(text_l, skip=hits)
+    for i in sorted(hits):
+        r = terms[i]
+        out.append({
+            "concept_id": r["concept_id"],
+            "level": 1,
+            "rule_id": None,
+            "pattern_str": None,
+            "term_or_phrase": r["term"],
+            "score": 0.5 * r["weight"] + 0.1 * r["priority"],
+            "method": "lexical"
+        })
 
     # 2) Key phrases (string match case-insensitive)
-    for r in kps:
+    for i in sorted(phrase_hits):
+        r = kps[i]
         phrase = r["phrase"].lower()
-        if phrase and phrase in text_l:
-            out.append({
-                "concept_id": r["concept_id"],
-                "level": 1,
-                "rule_id": None,
-                "pattern_str": phrase,
-                "term_or_phrase": r["phrase"],
-                "score": 1.0 * r["weight"] + 0.2 * r["priority"],
-                "method": "lexical"
-            })
-
-    # 3) Pattern rules (regex + negação)
-    for r in rules:
-        if r["pattern"].search(sent_text):
-            neg_block = r["neg"].search(sent_text) if r["neg"] else False
-            lvl = LEVEL_MAP.get(r["level_type"], 1)
-            score = 1.5 + 0.3 * r["priority"]
-            if neg_block and r["level_type"] != "negation":
-                score *= 0.2  # penaliza se houver padrão de negação
-            out.append({
-                "concept_id": None,  # nivel via pattern pode ser genérico; conceito vem dos termos/frases na mesma sentença
-                "level": lvl,
-                "rule_id": r["id"],
-                "pattern_str": r["pattern"].pattern,
-                "term_or_phrase": None,
-                "score": score,
-                "method": "lexical"
-            })
+        out.append({
+            "concept_id": r["concept_id"],
+            "level": 1,
+            "rule_id": None,
+            "pattern_str": phrase,
+            "term_or_phrase": r["phrase"],
+            "score": 1.0 * r["weight"] + 0.2 * r["priority"],
+            "method": "lexical"
+        })
+
+    # 3) Pattern rules (regex + negação; negação só roda nas regras que dispararam)
+    for i in comp["rules"].fired(sent_text):
+        r = rules[i]
+        neg_block = r["neg"].search(sent_text) if r["neg"] else False
+        lvl = LEVEL_MAP.get(r["level_type"], 1)
+        score = 1.5 + 0.3 * r["priority"]
+        if neg_block and r["level_type"] != "negation":
+            score *= 0.2  # penaliza se houver padrão de negação
+        out.append({
+            "concept_id": None,  # nivel via pattern pode ser genérico; conceito vem dos termos/frases na mesma sentença
+            "level": lvl,
+            "rule_id": r["id"],
+            "pattern_str": r["pattern"].pattern,
+            "term_or_phrase": None,
+            "score": score,
+            "method": "lexical"
+        })
 
     # Consolidação simples: se houver pattern + termo/frase, propaga conceito do termo/frase com maior score
     if any(c["rule_id"] for c in out) and any(c.get("concept_id") for c in out):
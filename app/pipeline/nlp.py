@@ -1,21 +1,92 @@
+import os
 from functools import lru_cache
+from itertools import islice
+from typing import Iterable, Iterator
 import spacy
 
-@lru_cache(maxsize=2)
-def get_nlp(lang: str):
-    if lang and lang.lower().startswith("pt"):
-        return spacy.load("pt_core_news_sm", disable=["ner"])
-    return spacy.load("en_core_web_sm", disable=["ner"])
+from .pool import ProcessPool
 
-def page_to_sentences(text: str, lang: str) -> list[dict]:
-    """Corta em sentenças + lemas; retorna [{'text','lemma_text'}]."""
-    nlp = get_nlp(lang or "en")
-    doc = nlp(text)
+NLP_BATCH_SIZE = int(os.getenv("NLP_BATCH_SIZE", "16"))   # páginas por lote do nlp.pipe
+NLP_N_PROCESS = int(os.getenv("NLP_N_PROCESS", "1"))      # >1: lotes de páginas num pool de processos (pool.py)
+
+# perfis de NLP:
+#   full  - modelo *_sm completo sem NER (parser define as sentenças)
+#   fast  - sem parser/NER: 'senter' estatístico + só o que o lematizador precisa
+#   regex - sem modelo: tokenizer + sentencizer por regras; lema = token em minúsculas
+NLP_PROFILES = ("full", "fast", "regex")
+NLP_PROFILE = os.getenv("NLP_PROFILE", "full").lower()
+
+def resolve_profile(profile: str | None) -> str:
+    profile = (profile or NLP_PROFILE).lower()
+    if profile not in NLP_PROFILES:
+        raise ValueError(f"perfil de NLP inválido: {profile}")
+    return profile
+
+@lru_cache(maxsize=6)
+def get_nlp(lang: str, profile: str | None = None):
+    profile = resolve_profile(profile)
+    pt = bool(lang and lang.lower().startswith("pt"))
+    if profile == "regex":
+        nlp = spacy.blank("pt" if pt else "en")
+        nlp.add_pipe("sentencizer")
+        return nlp
+    model = "pt_core_news_sm" if pt else "en_core_web_sm"
+    if profile == "fast":
+        nlp = spacy.load(model, exclude=["parser", "ner"])
+        nlp.enable_pipe("senter")
+        return nlp
+    return spacy.load(model, disable=["ner"])
+
+def _doc_sentences(doc, lemmas: bool = True) -> list[dict]:
+    # lemmas=False (perfil regex): não há lematizador, usa o próprio token
     out = []
     for sent in doc.sents:
         s = sent.text.strip()
         if not s:
             continue
-        lemma = " ".join([t.lemma_.lower() for t in sent if not t.is_space])
+        lemma = " ".join([(t.lemma_ if lemmas else t.text).lower() for t in sent if not t.is_space])
         out.append({"text": s, "lemma_text": lemma})
     return out
+
+def page_to_sentences(text: str, lang: str, profile: str | None = None) -> list[dict]:
+    """Corta em sentenças + lemas; retorna [{'text','lemma_text'}]."""
+    profile = resolve_profile(profile)
+    nlp = get_nlp(lang or "en", profile)
+    return _doc_sentences(nlp(text), lemmas=profile != "regex")
+
+def _segment_batch(batch: list[tuple[str, int]], lang: str, profile: str) -> list[dict]:
+    """Lote de (texto, página) -> sentenças; roda nos processos do pool (modelo herdado do fork)."""
+    nlp = get_nlp(lang or "en", profile)
+    out = []
+    for doc, page in nlp.pipe(batch, as_tuples=True, batch_size=len(batch) or 1):
+        for i, s in enumerate(_doc_sentences(doc, lemmas=profile != "regex")):
+            out.append({"page": page, "sent_idx": i, **s})
+    return out
+
+def pages_to_sentences(pages: Iterable[dict], lang: str,
+                       batch_size: int | None = None,
+                       n_process: int | None = None,
+                       profile: str | None = None) -> Iterator[dict]:
+    """
+    Segmenta um documento inteiro de uma vez: todas as páginas passam por nlp.pipe
+    (as_tuples mantém o número da página). Gera, na ordem,
+    {'page', 'sent_idx', 'text', 'lemma_text'} com sent_idx reiniciando a cada página.
+
+    Com n_process > 1, lotes de batch_size páginas vão para um pool de processos
+    (billiard: funciona dentro do prefork do Celery, onde o n_process do spaCy não).
+    """
+    profile = resolve_profile(profile)
+    batch_size = batch_size or NLP_BATCH_SIZE
+    n_process = max(1, n_process or NLP_N_PROCESS)
+    nlp = get_nlp(lang or "en", profile)  # carregado antes do fork: os filhos herdam
+    stream = ((p["text"], p["page"]) for p in pages)
+    if n_process == 1:
+        for doc, page in nlp.pipe(stream, as_tuples=True, batch_size=batch_size):
+            for i, s in enumerate(_doc_sentences(doc, lemmas=profile != "regex")):
+                yield {"page": page, "sent_idx": i, **s}
+        return
+
+    batches = ((b, lang, profile) for b in iter(lambda: list(islice(stream, batch_size)), []))
+    with ProcessPool(n_process) as pool:
+        for sents in pool.imap(_segment_batch, batches, window=2 * n_process):
+            yield from sents
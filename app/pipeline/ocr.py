@@ -0,0 +1,123 @@
+# app/pipeline/ocr.py
+"""
+OCR seletivo para páginas escaneadas.
+
+Só passa pelo Tesseract a página cuja camada de texto está vazia ou abaixo de
+OCR_MIN_CHARS. As páginas são rasterizadas (pdf2image) e lidas em paralelo (threads),
+e o resultado fica em page_ocr_cache, com chave (sha256 do documento, página, DPI,
+idioma do OCR): reprocessar nunca refaz OCR.
+"""
+import hashlib, logging, os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice, repeat
+from typing import Iterable, Iterator
+
+from sqlalchemy import bindparam, text
+from app.db import engine
+
+logger = logging.getLogger(__name__)
+
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() == "true"
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "25"))   # caracteres não brancos abaixo dos quais a página vai pro OCR
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_LANG = os.getenv("OCR_LANG", "")                    # vazio = deduz do idioma do documento
+# pdftoppm e tesseract rodam como subprocessos: threads bastam (o GIL fica livre enquanto
+# esperam) e funcionam também nos filhos daemon do prefork do Celery
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0"))        # 0 = os.cpu_count()
+OCR_WINDOW = int(os.getenv("OCR_WINDOW", "32"))         # páginas avaliadas por vez (mantém o fluxo em streaming)
+
+SQL_FETCH = text("""
+    SELECT page, text FROM page_ocr_cache
+    WHERE sha256 = :sha256 AND dpi = :dpi AND ocr_lang = :ocr_lang AND page IN :pages
+""").bindparams(bindparam("pages", expanding=True))
+
+SQL_INSERT = text("""
+    INSERT INTO page_ocr_cache (sha256, page, dpi, ocr_lang, text)
+    VALUES (:sha256, :page, :dpi, :ocr_lang, :text)
+    ON CONFLICT (sha256, page, dpi, ocr_lang) DO NOTHING
+""")
+
+def ocr_lang_for(lang: str | None) -> str:
+    if OCR_LANG:
+        return OCR_LANG
+    lang = (lang or "").lower()
+    if lang.startswith("pt"):
+        return "por"
+    if lang.startswith("en"):
+        return "eng"
+    return "por+eng"
+
+def needs_ocr(page_text: str) -> bool:
+    return len("".join((page_text or "").split())) < OCR_MIN_CHARS
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def ocr_page(pdf_path: str, page: int, dpi: int, ocr_lang: str) -> str | None:
+    """Texto de uma página (1-indexed) via Tesseract; None se a rasterização/OCR falhar."""
+    from pdf2image import convert_from_path
+    import pytesseract
+    try:
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=page, last_page=page)
+        return "\n".join(pytesseract.image_to_string(im, lang=ocr_lang) for im in images)
+    except Exception as e:
+        logger.warning("OCR falhou em %s p.%s: %s", pdf_path, page, e)
+        return None
+
+def _fetch_cached(sha256: str, pages: list[int], dpi: int, ocr_lang: str) -> dict:
+    with engine.begin() as conn:
+        rows = conn.execute(SQL_FETCH, {"sha256": sha256, "dpi": dpi, "ocr_lang": ocr_lang, "pages": pages})
+        return {int(p): t for p, t in rows}
+
+def _store(sha256: str, texts: dict, dpi: int, ocr_lang: str) -> None:
+    rows = [
+        {"sha256": sha256, "page": p, "dpi": dpi, "ocr_lang": ocr_lang, "text": t}
+        for p, t in texts.items() if t is not None
+    ]
+    if rows:
+        with engine.begin() as conn:
+            conn.execute(SQL_INSERT, rows)
+
+def with_ocr(pages: Iterable[dict], pdf_path: str, sha256: str | None = None,
+             lang: str | None = None, workers: int | None = None) -> Iterator[dict]:
+    """
+    Repassa {'page', 'text'} na ordem, trocando o texto das páginas sem camada de texto
+    pelo OCR (do cache ou recém-feito). Avalia OCR_WINDOW páginas por vez.
+    """
+    if not OCR_ENABLED:
+        yield from pages
+        return
+    from .pool import cpu_workers
+    sha256 = sha256 or file_sha256(pdf_path)
+    ocr_lang = ocr_lang_for(lang)
+    workers = cpu_workers(workers or OCR_WORKERS)
+    ex = None
+    pages = iter(pages)
+    try:
+        while window := list(islice(pages, OCR_WINDOW)):
+            todo = [p["page"] for p in window if needs_ocr(p["text"])]
+            if todo:
+                got = _fetch_cached(sha256, todo, OCR_DPI, ocr_lang)
+                miss = [n for n in todo if n not in got]
+                if miss:
+                    args = (repeat(pdf_path), miss, repeat(OCR_DPI), repeat(ocr_lang))
+                    if workers > 1 and len(miss) > 1:
+                        ex = ex or ThreadPoolExecutor(max_workers=workers)
+                        new = dict(zip(miss, ex.map(ocr_page, *args)))
+                    else:
+                        new = dict(zip(miss, map(ocr_page, *args)))
+                    _store(sha256, new, OCR_DPI, ocr_lang)
+                    got.update(new)
+                    logger.info("OCR %s: %d página(s) novas, %d do cache", pdf_path, len(miss), len(todo) - len(miss))
+                for p in window:
+                    t = got.get(p["page"])
+                    if t and len(t.strip()) > len(p["text"].strip()):
+                        p["text"] = t
+            yield from window
+    finally:
+        if ex is not None:
+            ex.shutdown(wait=True, cancel_futures=True)
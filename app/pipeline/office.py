@@ -0,0 +1,295 @@
+# app/pipeline/office.py
+"""
+Extração de texto de documentos Office sem subir um LibreOffice por arquivo.
+
+  .docx  python-docx (parágrafos + tabelas); docx2txt como alternativa
+  .odt   leitura direta do content.xml (ODF)
+  .rtf   removedor de RTF leve (grupos, palavras de controle, \\'hh e \\uN)
+  .doc   LibreOffice: uma instância persistente por processo, dirigida via UNO
+"""
+import atexit, json, logging, os, re, select, shutil, socket, subprocess, tempfile, threading, zipfile
+from pathlib import Path
+from typing import Iterator
+from xml.etree import ElementTree as ET
+
+OFFICE_SUFFIXES = {".docx", ".odt", ".rtf", ".doc"}
+OFFICE_PAGE_CHARS = int(os.getenv("OFFICE_PAGE_CHARS", "3000"))   # tamanho das "páginas" sintéticas
+SOFFICE_BIN = os.getenv("SOFFICE_BIN", "soffice")
+SOFFICE_TIMEOUT = int(os.getenv("SOFFICE_TIMEOUT", "180"))
+SOFFICE_START_TIMEOUT = float(os.getenv("SOFFICE_START_TIMEOUT", "60"))   # s até o soffice aceitar conexões UNO
+SOFFICE_PYTHON = os.getenv("SOFFICE_PYTHON", "/usr/bin/python3")          # python com o módulo uno (python3-uno)
+
+logger = logging.getLogger(__name__)
+
+# -------- .docx --------
+def docx_text(path: Path) -> str:
+    try:
+        import docx
+    except ImportError:
+        import docx2txt
+        return docx2txt.process(str(path)) or ""
+    d = docx.Document(str(path))
+    parts = [p.text for p in d.paragraphs]
+    for table in d.tables:
+        for row in table.rows:
+            parts.append("\t".join(c.text for c in row.cells))
+    return "\n".join(parts)
+
+# -------- .odt --------
+_ODF_TEXT = "urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+_T = "{%s}" % _ODF_TEXT
+
+def _odf_inline(el, out: list) -> None:
+    if el.text:
+        out.append(el.text)
+    for child in el:
+        tag = child.tag
+        if tag == _T + "s":
+            out.append(" " * int(child.get(_T + "c", "1")))
+        elif tag == _T + "tab":
+            out.append("\t")
+        elif tag == _T + "line-break":
+            out.append("\n")
+        elif tag != _T + "note":  # notas de rodapé ficam fora do fluxo
+            _odf_inline(child, out)
+        if child.tail:
+            out.append(child.tail)
+
+def odt_text(path: Path) -> str:
+    with zipfile.ZipFile(path) as z:
+        root = ET.fromstring(z.read("content.xml"))
+    paras = []
+    def walk(el):
+        for child in el:
+            if child.tag in (_T + "p", _T + "h"):
+                out = []
+                _odf_inline(child, out)
+                paras.append("".join(out))
+            else:
+                walk(child)
+    walk(root)
+    return "\n".join(paras)
+
+# -------- .rtf --------
+_RTF_TOKEN = re.compile(r"\\([a-z]{1,32})(-?\d{1,10})? ?|\\'([0-9a-f]{2})|\\([^a-z])|([{}])|[\r\n]+|(.)", re.I | re.S)
+# destinos cujo conteúdo não é texto do documento
+_RTF_SKIP = {
+    "fonttbl", "colortbl", "stylesheet", "info", "pict", "object", "header", "footer",
+    "headerl", "headerr", "footerl", "footerr", "xmlnstbl", "listtable", "listoverridetable",
+    "rsidtbl", "generator", "themedata", "colorschememapping", "datastore", "latentstyles",
+}
+_RTF_CHARS = {"par": "\n", "line": "\n", "sect": "\n", "page": "\n", "tab": "\t", "cell": "\t",
+              "row": "\n", "emdash": "\u2014", "endash": "\u2013", "bullet": "\u2022",
+              "lquote": "\u2018", "rquote": "\u2019", "ldblquote": "\u201c", "rdblquote": "\u201d"}
+
+def rtf_to_text(rtf: str) -> str:
+    stack, out = [], []
+    skip, uc, pending_skip = False, 1, 0
+    encoding = "cp1252"
+    for m in _RTF_TOKEN.finditer(rtf):
+        word, arg, hexc, sym, brace, ch = m.groups()
+        if brace == "{":
+            stack.append((skip, uc))
+            continue
+        if brace == "}":
+            if stack:
+                skip, uc = stack.pop()
+            continue
+        if pending_skip and (ch or hexc):  # caracteres de fallback depois de \uN
+            pending_skip -= 1
+            continue
+        pending_skip = 0
+        if sym:
+            if sym == "*":
+                skip = True
+            elif not skip and sym in "\\{}":
+                out.append(sym)
+            elif not skip and sym == "~":
+                out.append("\u00a0")
+        elif word:
+            word = word.lower()
+            if word in _RTF_SKIP:
+                skip = True
+            elif word == "ansicpg" and arg:
+                encoding = f"cp{arg}"
+            elif word == "uc" and arg:
+                uc = int(arg)
+            elif word == "u" and arg:
+                if not skip:
+                    out.append(chr(int(arg) % 0x10000))
+                pending_skip = uc
+            elif not skip and word in _RTF_CHARS:
+                out.append(_RTF_CHARS[word])
+        elif hexc:
+            if not skip:
+                try:
+                    out.append(bytes([int(hexc, 16)]).decode(encoding))
+                except (LookupError, UnicodeDecodeError):
+                    out.append(bytes([int(hexc, 16)]).decode("cp1252", errors="ignore"))
+        elif ch and not skip:
+            out.append(ch)
+    # \uN vem em UTF-16: pares de surrogates viram um caractere; os soltos, U+FFFD
+    return "".join(out).encode("utf-16-le", "surrogatepass").decode("utf-16-le", errors="replace")
+
+def rtf_text(path: Path) -> str:
+    return rtf_to_text(path.read_bytes().decode("latin-1"))
+
+# -------- .doc (LibreOffice persistente) --------
+def _free_port() -> int:
+    with socket.socket() as sk:
+        sk.bind(("127.0.0.1", 0))
+        return sk.getsockname()[1]
+
+class SofficeConverter:
+    """
+    Um soffice headless que fica de pé, escutando UNO numa porta local, e a ponte
+    uno_bridge.py (rodando no python do LibreOffice) conectada a ele: cada .doc é
+    aberto com loadComponentFromURL e gravado com storeToURL, sem pagar a subida do
+    LibreOffice de novo. Se a instância não sobe (sem python3-uno, por exemplo), o
+    processo passa a converter no modo avulso (soffice --convert-to) sem tentar de novo.
+    """
+
+    def __init__(self):
+        self.workdir = None
+        self.soffice = None
+        self.bridge = None
+        self.lock = threading.Lock()
+        self.unavailable = False
+
+    def _env_arg(self, profile: Path) -> str:
+        return f"-env:UserInstallation={profile.as_uri()}"
+
+    def _alive(self) -> bool:
+        return (self.soffice is not None and self.soffice.poll() is None
+                and self.bridge is not None and self.bridge.poll() is None)
+
+    def _read(self, timeout: float) -> dict:
+        ready, _, _ = select.select([self.bridge.stdout], [], [], timeout)
+        if not ready:
+            raise TimeoutError("LibreOffice não respondeu")
+        line = self.bridge.stdout.readline()
+        if not line:
+            raise RuntimeError("ponte UNO encerrou")
+        return json.loads(line)
+
+    def _start(self) -> None:
+        self.workdir = Path(tempfile.mkdtemp(prefix="equiframe-soffice-"))
+        port = _free_port()
+        self.soffice = subprocess.Popen(
+            [SOFFICE_BIN, self._env_arg(self.workdir / "profile"), "--headless", "--invisible",
+             "--nologo", "--norestore", "--nodefault", "--nolockcheck",
+             f"--accept=socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self.bridge = subprocess.Popen(
+            [SOFFICE_PYTHON, str(Path(__file__).with_name("uno_bridge.py")), str(port), str(SOFFICE_START_TIMEOUT)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        )
+        if not self._read(SOFFICE_START_TIMEOUT + 5).get("ready"):
+            raise RuntimeError("ponte UNO não ficou pronta")
+
+    def _convert_uno(self, path: Path) -> str:
+        outdir = Path(tempfile.mkdtemp(prefix="soffice-out-"))
+        try:
+            dst = outdir / (path.stem + ".txt")
+            self.bridge.stdin.write(json.dumps({"src": str(path.resolve()), "dst": str(dst)}) + "\n")
+            self.bridge.stdin.flush()
+            res = self._read(SOFFICE_TIMEOUT)
+            if not res.get("ok"):
+                raise RuntimeError(res.get("error") or "conversão falhou")
+            return dst.read_text(encoding="utf-8", errors="ignore")
+        finally:
+            shutil.rmtree(outdir, ignore_errors=True)
+
+    def _convert_once(self, path: Path) -> str:
+        """Modo avulso: um soffice --convert-to com perfil próprio por arquivo."""
+        outdir = Path(tempfile.mkdtemp(prefix="soffice-out-"))
+        try:
+            subprocess.run(
+                [SOFFICE_BIN, self._env_arg(outdir / "profile"), "--headless", "--convert-to", "txt:Text",
+                 "--outdir", str(outdir), str(path)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT, timeout=SOFFICE_TIMEOUT, check=False,
+            )
+            out = outdir / (path.stem + ".txt")
+            if not out.exists():
+                raise RuntimeError(f"LibreOffice não converteu {path.name}")
+            return out.read_text(encoding="utf-8", errors="ignore")
+        finally:
+            shutil.rmtree(outdir, ignore_errors=True)
+
+    def to_text(self, path: Path) -> str:
+        with self.lock:
+            if not self.unavailable:
+                if not self._alive():
+                    self.close()
+                    try:
+                        self._start()
+                    except Exception as e:
+                        logger.warning("LibreOffice persistente indisponível (%s); usando conversão avulsa", e)
+                        self.close()
+                        self.unavailable = True
+                if not self.unavailable:
+                    try:
+                        return self._convert_uno(path)
+                    except Exception as e:
+                        # instância travada ou arquivo que a derrubou: recomeça no próximo
+                        logger.warning("conversão UNO falhou em %s: %s", path, e)
+                        self.close()
+        return self._convert_once(path)
+
+    def close(self) -> None:
+        for proc in (self.bridge, self.soffice):
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+        if self.bridge is not None and self.bridge.stdin:
+            self.bridge.stdin.close()
+            self.bridge.stdout.close()
+        self.soffice = self.bridge = None
+        if self.workdir is not None:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+            self.workdir = None
+
+_converter = None
+
+def doc_text(path: Path) -> str:
+    global _converter
+    if _converter is None:
+        _converter = SofficeConverter()
+    return _converter.to_text(path)
+
+def shutdown() -> None:
+    """Encerra o LibreOffice persistente deste processo (worker_process_shutdown do Celery)."""
+    global _converter
+    if _converter is not None:
+        _converter.close()
+        _converter = None
+
+atexit.register(shutdown)
+
+# -------- API --------
+_EXTRACTORS = {".docx": docx_text, ".odt": odt_text, ".rtf": rtf_text, ".doc": doc_text}
+
+def office_text(path) -> str:
+    """Texto de um .docx/.odt/.rtf/.doc."""
+    path = Path(path)
+    return _EXTRACTORS[path.suffix.lower()](path)
+
+def iter_pages_office(path) -> Iterator[dict]:
+    """
+    {'page', 'text'} para a pipeline v2. Formatos de fluxo não têm páginas: o texto é
+    cortado em blocos de ~OFFICE_PAGE_CHARS caracteres em fronteira de parágrafo.
+    """
+    page, buf, size = 1, [], 0
+    for para in office_text(path).split("\n"):
+        buf.append(para)
+        size += len(para) + 1
+        if size >= OFFICE_PAGE_CHARS:
+            yield {"page": page, "text": "\n".join(buf)}
+            page, buf, size = page + 1, [], 0
+    if buf and any(p.strip() for p in buf):
+        yield {"page": page, "text": "\n".join(buf)}
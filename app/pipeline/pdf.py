@@ -1,11 +1,54 @@
+import os
+from typing import Iterator
+
 import fitz  # PyMuPDF
-from pathlib import Path
 
-def extract_pages_text(pdf_path: str) -> list[dict]:
-    """Retorna [{'page': 1, 'text': '...'}, ...]  (1-indexed)."""
+from .pool import ProcessPool, cpu_workers
+
+# extração paralela: cada worker abre o PDF e extrai uma fatia de páginas. Desligada por
+# padrão: o pool nasce dentro de cada filho do Celery (-c N), então N filhos com
+# PDF_WORKERS processos cada disputam os mesmos núcleos; ligue só com poucos filhos
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "1"))                    # 1 = sequencial; 0 = os.cpu_count()
+PDF_MAX_WORKERS = int(os.getenv("PDF_MAX_WORKERS", "4"))            # teto do pool por documento
+PDF_SHARD_PAGES = int(os.getenv("PDF_SHARD_PAGES", "16"))           # páginas por fatia
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "400"))  # abaixo disso, sequencial
+
+def page_count(pdf_path: str) -> int:
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+def _extract_range(pdf_path: str, start: int, stop: int) -> list[dict]:
+    """Páginas [start, stop) (0-indexed) -> [{'page', 'text'}] (page 1-indexed)."""
     out = []
     with fitz.open(pdf_path) as doc:
-        for i, page in enumerate(doc, start=1):
-            text = page.get_text("text") or ""
-            out.append({"page": i, "text": text})
+        for i in range(start, stop):
+            text = doc[i].get_text("text") or ""
+            out.append({"page": i + 1, "text": text})
     return out
+
+def iter_pages_text(pdf_path: str, workers: int | None = None,
+                    shard_pages: int | None = None) -> Iterator[dict]:
+    """
+    Gera {'page', 'text'} na ordem das páginas, à medida que ficam prontas.
+
+    Com mais de um worker, o documento é fatiado em faixas de `shard_pages` páginas
+    distribuídas num pool de processos (billiard, que funciona dentro do prefork do
+    Celery); no máximo 2 * workers faixas ficam em voo, então a página 1 chega ao
+    consumidor sem esperar a extração do resto.
+    """
+    n = page_count(pdf_path)
+    workers = min(cpu_workers(workers or PDF_WORKERS), max(1, PDF_MAX_WORKERS))
+    shard = max(1, shard_pages or PDF_SHARD_PAGES)
+    ranges = ((pdf_path, s, min(s + shard, n)) for s in range(0, n, shard))
+    if workers <= 1 or n < PDF_PARALLEL_MIN_PAGES:
+        for r in ranges:
+            yield from _extract_range(*r)
+        return
+
+    with ProcessPool(workers) as pool:
+        for pages in pool.imap(_extract_range, ranges, window=2 * workers):
+            yield from pages
+
+def extract_pages_text(pdf_path: str) -> list[dict]:
+    """Retorna [{'page': 1, 'text': '...'}, ...]  (1-indexed)."""
+    return list(iter_pages_text(pdf_path))
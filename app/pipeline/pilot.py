@@ -1,5 +1,7 @@
-import os, re, csv, json, subprocess, shlex
+import os, re, csv, json, math, hashlib, subprocess, shlex
 from pathlib import Path
+from .ocr import file_sha256
+from .office import OFFICE_SUFFIXES, office_text
 
 DATA_DIR = Path("/data")
 INPUT_DIR = DATA_DIR / "input"
@@ -11,31 +13,29 @@ CSV_TERMS    = DATA_DIR / "equiframe_lexicon_terms_v2.csv"
 CSV_PHRASES  = DATA_DIR / "equiframe_key_phrases_v2.csv"
 CSV_PATTERNS = DATA_DIR / "equiframe_pattern_rules_v2.csv"
 
-def extract_text(path: Path) -> str:
+PILOT_BATCH_SIZE = int(os.getenv("PILOT_BATCH_SIZE", "2000"))            # evidências por lote no Postgres
+PILOT_EXPORT = os.getenv("PILOT_EXPORT", "false").lower() == "true"      # também grava evidences.csv/.jsonl
+
+def extract_text(path: Path) -> str | None:
+    """Texto do arquivo; None se a extração falhou (o arquivo fica para a próxima rodada)."""
     p = str(path)
     if path.suffix.lower() == ".pdf":
         cmd = f'pdftotext -layout -enc UTF-8 {shlex.quote(p)} -'
         try:
             return subprocess.check_output(cmd, shell=True, stderr=subprocess.STDOUT, timeout=180).decode("utf-8", errors="ignore")
-        except subprocess.CalledProcessError:
-            return ""
-    elif path.suffix.lower() in [".doc", ".docx", ".odt", ".rtf"]:
-        out_txt = path.with_suffix(".txt")
-        cmd = f'libreoffice --headless --convert-to txt:Text --outdir {shlex.quote(str(path.parent))} {shlex.quote(p)}'
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+            return None
+    elif path.suffix.lower() in OFFICE_SUFFIXES:
+        # extração em processo; só .doc usa o LibreOffice (instância persistente)
         try:
-            subprocess.check_call(cmd, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT, timeout=180)
-            return out_txt.read_text(encoding="utf-8", errors="ignore") if out_txt.exists() else ""
-        except subprocess.CalledProcessError:
-            return ""
-        finally:
-            if out_txt.exists():
-                try: out_txt.unlink()
-                except Exception: pass
+            return office_text(path)
+        except Exception:
+            return None
     else:
         try:
             return path.read_text(encoding="utf-8", errors="ignore")
         except Exception:
-            return ""
+            return None
 
 def load_csv_rows(path: Path):
     import pandas as pd
@@ -60,49 +60,145 @@ def sentence_iter(text: str):
         s2 = s.strip()
         if s2: yield s2
 
+def list_input_files() -> list[Path]:
+    files = []
+    if (INPUT_DIR).exists():
+        for ext in ("*.pdf","*.doc","*.docx","*.odt","*.rtf","*.txt"):
+            files.extend(INPUT_DIR.glob(ext))
+    return files
+
+def dictionary_key() -> str:
+    """Impressão digital dos CSVs do dicionário: se mudar, todos os arquivos são refeitos."""
+    h = hashlib.md5(usedforsecurity=False)
+    for p in (CSV_TERMS, CSV_PHRASES, CSV_PATTERNS):
+        h.update(file_sha256(p).encode() if p.exists() else b"-")
+    return h.hexdigest()
+
+def _val(v):
+    # CSV do dicionário via pandas: vazio vira NaN
+    return None if v is None or (isinstance(v, float) and math.isnan(v)) or v == "" else v
+
+def _int(v):
+    v = _val(v)
+    try:
+        return int(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def match_text(doc_name: str, text: str, terms, phrases, comp_patterns):
+    """Gera (linha de evidences na ordem de EVIDENCE_COLUMNS, objeto do JSONL)."""
+    for sent in sentence_iter(text):
+        s_norm = sent.lower()
+
+        for r in terms:
+            t = str(r.get("term","")).strip().lower()
+            if t and t in s_norm:
+                yield ((doc_name, _int(r.get("concept_id")), "term", 1, _val(r.get("lang")), sent[:500], None, t,
+                        None, None, None, "lexical"),
+                       {"doc":doc_name,"concept_id":r.get("concept_id"),"type":"term","level":1,"lang":r.get("lang"),"text":sent})
+
+        for r in phrases:
+            p = str(r.get("phrase","")).strip().lower()
+            if p and p in s_norm:
+                yield ((doc_name, _int(r.get("concept_id")), "phrase", 2, _val(r.get("lang")), sent[:500], None, p,
+                        None, None, None, "lexical"),
+                       {"doc":doc_name,"concept_id":r.get("concept_id"),"type":"phrase","level":2,"lang":r.get("lang"),"text":sent})
+
+        for rx, r in comp_patterns:
+            if rx.search(sent):
+                lvl = int(r.get("level") or 3)
+                patt = r.get("pattern","")
+                yield ((doc_name, _int(r.get("concept_id")), "pattern", lvl, _val(r.get("lang")), sent[:500], _val(patt), None,
+                        None, None, None, "lexical"),
+                       {"doc":doc_name,"concept_id":r.get("concept_id"),"type":"pattern","level":lvl,"lang":r.get("lang") or "","text":sent,"pattern":patt})
+
 def run_pilot():
+    """
+    Incremental: só arquivos novos ou alterados (manifesto em pilot_manifest) são
+    extraídos e casados; as evidências vão direto para o Postgres em lotes.
+    Arquivo alterado tem as evidências legadas anteriores substituídas.
+    PILOT_EXPORT=true grava também evidences.csv/.jsonl com as evidências desta execução.
+    """
+    from app.db import EVIDENCE_COLUMNS, engine, merge_evidences
+    from sqlalchemy import text as sql
+
     terms   = load_csv_rows(CSV_TERMS)
     phrases = load_csv_rows(CSV_PHRASES)
     patterns= load_csv_rows(CSV_PATTERNS)
     comp_patterns = compile_patterns(patterns)
+    dict_key = dictionary_key()
+
+    with engine.begin() as conn:
+        manifest = {r["path"]: r for r in conn.execute(sql(
+            "SELECT path, size, mtime, sha256, dict_key FROM pilot_manifest")).mappings()}
 
     out_csv = OUTPUT_DIR / "evidences.csv"
     out_json = OUTPUT_DIR / "evidences.jsonl"
-    with open(out_csv, "w", newline="", encoding="utf-8") as fout, open(out_json, "w", encoding="utf-8") as jout:
+    fout = jout = w = None
+    if PILOT_EXPORT:
+        fout = open(out_csv, "w", newline="", encoding="utf-8")
+        jout = open(out_json, "w", encoding="utf-8")
         w = csv.writer(fout)
-        w.writerow(["doc_name","concept_id","match_type","level","lang","snippet","pattern","term_or_phrase"])
-
-        files = []
-        if (INPUT_DIR).exists():
-            for ext in ("*.pdf","*.doc","*.docx","*.odt","*.rtf","*.txt"):
-                files.extend(INPUT_DIR.glob(ext))
+        w.writerow(EVIDENCE_COLUMNS)
 
+    files = list_input_files()
+    processed = skipped = failed = inserted = 0
+    try:
         for f in files:
+            st = f.stat()
+            m = manifest.get(str(f))
+            if m and m["dict_key"] == dict_key and m["size"] == st.st_size and m["mtime"] == st.st_mtime:
+                skipped += 1
+                continue
+            digest = file_sha256(f)
+            params = dict(path=str(f), size=st.st_size, mtime=st.st_mtime, sha256=digest, dict_key=dict_key)
+            if m and m["dict_key"] == dict_key and m["sha256"] == digest:
+                # só o mtime mudou (cópia/touch): conteúdo já processado
+                with engine.begin() as conn:
+                    conn.execute(sql("UPDATE pilot_manifest SET size=:size, mtime=:mtime WHERE path=:path"), params)
+                skipped += 1
+                continue
+
             text = extract_text(f)
-            if not text: continue
-            for sent in sentence_iter(text):
-                s_norm = sent.lower()
-
-                for r in terms:
-                    t = str(r.get("term","")).strip().lower()
-                    if t and t in s_norm:
-                        w.writerow([f.name, r.get("concept_id"), "term", 1, r.get("lang"), sent[:500], "", t])
-                        jout.write(json.dumps({"doc":f.name,"concept_id":r.get("concept_id"),"type":"term","level":1,"lang":r.get("lang"),"text":sent})+"\n")
-
-                for r in phrases:
-                    p = str(r.get("phrase","")).strip().lower()
-                    if p and p in s_norm:
-                        w.writerow([f.name, r.get("concept_id"), "phrase", 2, r.get("lang"), sent[:500], "", p])
-                        jout.write(json.dumps({"doc":f.name,"concept_id":r.get("concept_id"),"type":"phrase","level":2,"lang":r.get("lang"),"text":sent})+"\n")
-
-                for rx, r in comp_patterns:
-                    if rx.search(sent):
-                        lvl = int(r.get("level") or 3)
-                        patt = r.get("pattern","")
-                        w.writerow([f.name, r.get("concept_id"), "pattern", lvl, r.get("lang") or "", sent[:500], patt, ""])
-                        jout.write(json.dumps({"doc":f.name,"concept_id":r.get("concept_id"),"type":"pattern","level":lvl,"lang":r.get("lang") or "","text":sent,"pattern":patt})+"\n")
-
-    return {"processed": len(files), "output_csv": str(out_csv), "output_jsonl": str(out_json)}
+            if text is None:
+                failed += 1  # sem manifest: tenta de novo na próxima rodada
+                continue
+            n = 0
+            with engine.begin() as conn:
+                if m:
+                    conn.execute(sql("""
+                        DELETE FROM evidences
+                        WHERE doc_name = :doc_name AND match_type IN ('term','phrase','pattern')
+                    """), {"doc_name": f.name})
+                batch = []
+                for row, obj in match_text(f.name, text, terms, phrases, comp_patterns) if text else ():
+                    batch.append(row)
+                    if w is not None:
+                        w.writerow(row)
+                        jout.write(json.dumps(obj)+"\n")
+                    if len(batch) >= PILOT_BATCH_SIZE:
+                        n += merge_evidences(conn, batch)
+                        batch = []
+                n += merge_evidences(conn, batch)
+                conn.execute(sql("""
+                    INSERT INTO pilot_manifest (path, size, mtime, sha256, dict_key, evidences, processed_at)
+                    VALUES (:path, :size, :mtime, :sha256, :dict_key, :evidences, now())
+                    ON CONFLICT (path) DO UPDATE
+                      SET size = EXCLUDED.size, mtime = EXCLUDED.mtime, sha256 = EXCLUDED.sha256,
+                          dict_key = EXCLUDED.dict_key, evidences = EXCLUDED.evidences,
+                          processed_at = EXCLUDED.processed_at
+                """), {**params, "evidences": n})
+            processed += 1
+            inserted += n
+    finally:
+        if fout is not None:
+            fout.close()
+            jout.close()
+
+    out = {"processed": processed, "skipped": skipped, "failed": failed, "inserted": inserted}
+    if PILOT_EXPORT:
+        out.update(output_csv=str(out_csv), output_jsonl=str(out_json))
+    return out
 
 if __name__ == "__main__":
     print(run_pilot())
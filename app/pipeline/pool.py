@@ -0,0 +1,71 @@
+# app/pipeline/pool.py
+"""
+Pool de processos que também funciona dentro do worker do Celery.
+
+Os filhos do prefork do Celery são processos daemon, e multiprocessing /
+concurrent.futures se recusam a criar processos a partir deles. O billiard (o
+multiprocessing do Celery) não tem essa restrição e vem com o Celery; sem ele
+(scripts avulsos), cai no ProcessPoolExecutor.
+"""
+import os
+from collections import deque
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+
+def cpu_workers(workers: int | None = None) -> int:
+    return max(1, workers or os.cpu_count() or 1)
+
+class ProcessPool:
+    def __init__(self, workers: int):
+        self.workers = workers
+        try:
+            import billiard
+            self.pool, self.ex = billiard.Pool(processes=workers), None
+        except ImportError:
+            from concurrent.futures import ProcessPoolExecutor
+            self.pool, self.ex = None, ProcessPoolExecutor(max_workers=workers)
+
+    def submit(self, fn: Callable, *args):
+        """Dispara fn(*args); o retorno tem .result() (bloqueia até ficar pronto)."""
+        if self.ex is not None:
+            return self.ex.submit(fn, *args)
+        return _Result(self.pool.apply_async(fn, args))
+
+    def imap(self, fn: Callable, args: Iterable[tuple], window: int | None = None) -> Iterator:
+        """fn(*a) para cada a em `args`, na ordem, com no máximo `window` tarefas em voo."""
+        window = max(1, window or 2 * self.workers)
+        args = iter(args)
+        pending = deque(self.submit(fn, *a) for a in islice(args, window))
+        while pending:
+            fut = pending.popleft()
+            nxt = next(args, None)
+            if nxt is not None:
+                pending.append(self.submit(fn, *nxt))
+            yield fut.result()
+
+    def map(self, fn: Callable, *iterables) -> list:
+        return list(self.imap(fn, zip(*iterables)))
+
+    def shutdown(self, cancel: bool = False) -> None:
+        if self.ex is not None:
+            self.ex.shutdown(wait=True, cancel_futures=cancel)
+        elif cancel:
+            self.pool.terminate()
+            self.pool.join()
+        else:
+            self.pool.close()
+            self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # saída antecipada (consumidor parou de ler ou erro): descarta o que está em voo
+        self.shutdown(cancel=True)
+
+class _Result:
+    def __init__(self, res):
+        self.res = res
+
+    def result(self):
+        return self.res.get()
@@ -0,0 +1,131 @@
+# app/pipeline/rules.py
+import re
+
+try:  # Python 3.11+
+    from re import _parser as sre_parse, _constants as sre_c
+except ImportError:  # pragma: no cover
+    import sre_parse, sre_constants as sre_c
+
+from .automaton import AhoCorasick
+
+MIN_FACTOR_LEN = 2   # literais mais curtos não filtram nada; a regra roda sempre
+MAX_ALTERNATIVES = 32
+
+_REPEATS = {sre_c.MAX_REPEAT, sre_c.MIN_REPEAT}
+if hasattr(sre_c, "POSSESSIVE_REPEAT"):
+    _REPEATS.add(sre_c.POSSESSIVE_REPEAT)
+
+
+def fold(s: str) -> str:
+    """
+    Normalização usada no pré-filtro; cobre as equivalências de re.IGNORECASE.
+    'İ' casa com i/I em re.IGNORECASE, mas o casefold dela tem dois caracteres ('i̇'):
+    vira 'i' antes. É o único caractere de casefold longo com equivalente de um só.
+    """
+    return s.replace("İ", "i").casefold().replace("ı", "i")
+
+
+def _best(cands: list[set]) -> set | None:
+    cands = [c for c in cands if c and all(c) and len(c) <= MAX_ALTERNATIVES]
+    if not cands:
+        return None
+    return max(cands, key=lambda c: (min(map(len, c)), -len(c)))
+
+
+def _item_factors(op, av) -> set | None:
+    if op in _REPEATS:
+        lo, _, sub = av
+        return _seq_factors(sub) if lo >= 1 else None
+    if op is sre_c.SUBPATTERN:
+        return _seq_factors(av[-1])
+    if op is getattr(sre_c, "ATOMIC_GROUP", None):
+        return _seq_factors(av)
+    if op is sre_c.ASSERT:
+        return _seq_factors(av[1])
+    if op is sre_c.BRANCH:
+        out = set()
+        for seq in av[1]:
+            f = _seq_factors(seq)
+            if not f:
+                return None
+            out |= f
+        return out
+    return None
+
+
+def _literal_set(av) -> list[str] | None:
+    chars = []
+    for op, v in av:
+        if op is not sre_c.LITERAL:
+            return None
+        chars.append(chr(v))
+    return chars
+
+
+def _seq_factors(seq) -> set | None:
+    """
+    Conjunto de literais tal que todo match da sequência contém pelo menos um deles
+    (o "fator obrigatório" de RE2/Hyperscan). None quando não há fator útil.
+    """
+    cands, runs = [], {""}
+    for op, av in seq:
+        if op is sre_c.LITERAL:
+            runs = {r + chr(av) for r in runs}
+            continue
+        if op is sre_c.IN:
+            chars = _literal_set(av)
+            if chars and len(runs) * len(chars) <= MAX_ALTERNATIVES:
+                runs = {r + c for r in runs for c in chars}
+                continue
+        cands.append(runs)
+        cands.append(_item_factors(op, av))
+        runs = {""}
+    cands.append(runs)
+    return _best(cands)
+
+
+def required_factors(pattern: re.Pattern) -> set | None:
+    """Fatores (já normalizados com fold) de uma regra compilada, ou None."""
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return None
+    f = _seq_factors(parsed)
+    if not f:
+        return None
+    if any(len(fold(c)) != 1 for x in f for c in x):
+        return None  # ß, ligaturas...: o casefold muda o comprimento; a regra roda sempre
+    f = {fold(x) for x in f}
+    return f if min(map(len, f)) >= MIN_FACTOR_LEN else None
+
+
+class RuleSet:
+    """
+    Regras de um idioma compiladas num único scanner.
+
+    Um autômato Aho-Corasick com os literais obrigatórios de todas as regras varre a
+    sentença uma vez e aponta as regras candidatas; só essas (mais as regras sem
+    literal extraível) executam o .search() de confirmação. O resultado é idêntico
+    ao laço regra a regra (regras com literais cujo casefold muda de comprimento
+    não entram no autômato).
+    """
+
+    def __init__(self, rules: list[dict]):
+        self.rules = rules
+        self.always: list[int] = []
+        self.ac = AhoCorasick()
+        for i, r in enumerate(rules):
+            factors = required_factors(r["pattern"])
+            if factors is None:
+                self.always.append(i)
+                continue
+            for f in factors:
+                self.ac.add(f, i)
+        self.ac.build()
+
+    def fired(self, text: str) -> list[int]:
+        """Índices (na ordem original) das regras cujo padrão casa em `text`."""
+        cands = self.ac.find_all(fold(text))
+        cands.update(self.always)
+        rules = self.rules
+        return [i for i in sorted(cands) if rules[i]["pattern"].search(text)]
@@ -0,0 +1,174 @@
+# app/pipeline/semantic.py
+"""
+Estágio semântico (opcional): sentenças x protótipos de conceito via embeddings.
+
+Protótipos = definição/nome de cada conceito (concepts) + key phrases do dicionário.
+Ficam num índice FAISS (produto interno sobre vetores normalizados = cosseno),
+persistido em disco e reconstruído só quando o dicionário ou os conceitos mudam.
+"""
+import hashlib, json, os
+from functools import lru_cache
+from pathlib import Path
+
+from sqlalchemy import text
+from app.db import engine
+
+from .embed_store import get_vectors
+
+SEMANTIC_ENABLED = os.getenv("SEMANTIC_ENABLED", "false").lower() == "true"
+SEMANTIC_MODEL = os.getenv("SEMANTIC_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+SEMANTIC_THRESHOLD = float(os.getenv("SEMANTIC_THRESHOLD", "0.6"))
+SEMANTIC_TOP_K = int(os.getenv("SEMANTIC_TOP_K", "3"))
+SEMANTIC_BATCH_SIZE = int(os.getenv("SEMANTIC_BATCH_SIZE", "256"))
+SEMANTIC_INDEX_DIR = Path(os.getenv("SEMANTIC_INDEX_DIR", "/data/cache/semantic"))
+
+@lru_cache(maxsize=1)
+def get_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(SEMANTIC_MODEL, device="cpu")
+
+def encode(texts: list[str]):
+    """Embeddings normalizados (float32), em lotes grandes de CPU."""
+    import numpy as np
+    if not texts:
+        return np.zeros((0, get_model().get_sentence_embedding_dimension()), dtype="float32")
+    vecs = get_model().encode(
+        texts, batch_size=SEMANTIC_BATCH_SIZE, convert_to_numpy=True,
+        normalize_embeddings=True, show_progress_bar=False,
+    )
+    return vecs.astype("float32", copy=False)
+
+# -------- protótipos de conceito --------
+_protos_cache: dict = {}
+
+def load_prototypes(dct) -> list[dict]:
+    """
+    [{'concept_id', 'text'}] a partir de concepts (nome/definição) + key phrases.
+    Reaproveitado enquanto a versão do dicionário (que cobre concepts) não muda.
+    """
+    version = dct.get("version")
+    cached = _protos_cache.get("current")
+    if cached is not None and version is not None and cached[0] == version:
+        return cached[1]
+    with engine.begin() as conn:
+        concepts = conn.execute(text("""
+            SELECT id, concept_name_en, concept_name_pt, definition_en, definition_pt
+            FROM concepts ORDER BY id
+        """)).mappings().all()
+    protos, seen = [], set()
+    def add(cid, t):
+        t = (t or "").strip()
+        if cid is not None and t and (cid, t.lower()) not in seen:
+            seen.add((cid, t.lower()))
+            protos.append({"concept_id": int(cid), "text": t})
+    for c in concepts:
+        add(c["id"], c["definition_en"] or c["concept_name_en"])
+        add(c["id"], c["definition_pt"] or c["concept_name_pt"])
+    for rows in dct["phrases_by_lang"].values():
+        for r in rows:
+            add(r["concept_id"], r["phrase"])
+    _protos_cache["current"] = (version, protos)
+    return protos
+
+def _index_key(protos: list[dict]) -> str:
+    h = hashlib.md5(usedforsecurity=False)
+    h.update(SEMANTIC_MODEL.encode("utf-8"))
+    for p in protos:
+        h.update(f"\n{p['concept_id']}\t{p['text']}".encode("utf-8"))
+    return h.hexdigest()
+
+class ConceptIndex:
+    def __init__(self, key: str, index, protos: list[dict]):
+        self.key = key
+        self.index = index
+        self.protos = protos
+        self.dict_version = None  # versão do dicionário para a qual os protótipos foram conferidos
+
+    @classmethod
+    def build(cls, key: str, protos: list[dict]) -> "ConceptIndex":
+        import faiss
+        vecs = encode([p["text"] for p in protos])
+        index = faiss.IndexFlatIP(vecs.shape[1])
+        index.add(vecs)
+        return cls(key, index, protos)
+
+    def save(self, base: Path) -> None:
+        import faiss
+        base.parent.mkdir(parents=True, exist_ok=True)
+        faiss.write_index(self.index, str(base.with_suffix(".faiss")))
+        base.with_suffix(".json").write_text(json.dumps(self.protos, ensure_ascii=False), encoding="utf-8")
+
+    @classmethod
+    def load(cls, key: str, base: Path):
+        import faiss
+        try:
+            index = faiss.read_index(str(base.with_suffix(".faiss")))
+            protos = json.loads(base.with_suffix(".json").read_text(encoding="utf-8"))
+        except Exception:
+            return None
+        return cls(key, index, protos)
+
+_index_cache: dict = {}
+
+def get_concept_index(dct) -> ConceptIndex:
+    """Índice de protótipos da versão atual (memória -> disco -> reconstrução)."""
+    ci = _index_cache.get("current")
+    if ci is not None and dct.get("version") is not None and ci.dict_version == dct["version"]:
+        return ci
+    protos = load_prototypes(dct)
+    key = _index_key(protos)
+    if ci is not None and ci.key == key:
+        ci.dict_version = dct.get("version")
+        return ci
+    base = SEMANTIC_INDEX_DIR / f"concepts-{key}"
+    ci = ConceptIndex.load(key, base)
+    if ci is None:
+        ci = ConceptIndex.build(key, protos)
+        try:
+            ci.save(base)
+        except OSError:
+            pass
+    ci.dict_version = dct.get("version")
+    _index_cache["current"] = ci
+    return ci
+
+# -------- matching --------
+def semantic_matches(sentences, dct, skip: dict | None = None) -> dict:
+    """
+    {sentence_id: [matches]} com method='semantic' para os conceitos cujo protótipo
+    mais próximo passa de SEMANTIC_THRESHOLD. `skip` = {sentence_id: {concept_ids}}
+    já cobertos pelo léxico (não duplicam evidência).
+    """
+    sentences = list(sentences)
+    if not sentences:
+        return {}
+    ci = get_concept_index(dct)
+    if not ci.protos:
+        return {}
+    vecs = get_vectors([s["text"] for s in sentences], SEMANTIC_MODEL, encode)
+    k = min(max(SEMANTIC_TOP_K, 1) * 4, len(ci.protos))
+    sims, idxs = ci.index.search(vecs, k)
+
+    skip = skip or {}
+    out = {}
+    for s, row_s, row_i in zip(sentences, sims, idxs):
+        best = {}
+        for sim, j in zip(row_s, row_i):
+            if j < 0 or sim < SEMANTIC_THRESHOLD:
+                continue
+            p = ci.protos[j]
+            cid = p["concept_id"]
+            if cid in skip.get(s["id"], ()) or (cid in best and best[cid]["score"] >= sim):
+                continue
+            best[cid] = {
+                "concept_id": cid,
+                "level": 1,
+                "rule_id": None,
+                "pattern_str": None,
+                "term_or_phrase": p["text"][:200],
+                "score": float(sim),
+                "method": "semantic",
+            }
+        if best:
+            out[s["id"]] = sorted(best.values(), key=lambda m: -m["score"])[:SEMANTIC_TOP_K]
+    return out
@@ -1,105 +1,104 @@
 # app/pipeline/tasks.py
 import os
-import pandas as pd
-from celery import shared_task
+from celery import group, shared_task
 from celery.utils.log import get_task_logger
-from app.db import insert_evidences_df, engine
+from app.db import engine
 from sqlalchemy import text
-# legado: sua pipeline atual que exporta evidences.csv/jsonl
+# legado: piloto incremental que grava as evidências direto no Postgres
 from .pilot import run_pilot  # mantém compatibilidade
 
 logger = get_task_logger(__name__)
 
-OUTPUT_CSV = "/data/output/evidences.csv"
-OUTPUT_JSONL = "/data/output/evidences.jsonl"
-
 # escolhe a implementação da pipeline: 'legacy' (default) ou 'v2'
 PIPELINE_IMPL = os.getenv("PIPELINE_IMPL", "legacy").lower()
 REINDEX_AFTER = os.getenv("REINDEX_AFTER_BATCH", "false").lower() == "true"
 BATCH_LIMIT = int(os.getenv("BATCH_LIMIT", "10"))
-
-def _insert_df_with_defaults(df: pd.DataFrame) -> int:
-    """
-    Padroniza colunas do CSV legado para o schema atual de evidences
-    e usa a função de inserção existente (ON CONFLICT DO NOTHING).
-    """
-    # colunas mínimas esperadas pelo banco
-    required = [
-        "doc_name", "concept_id", "match_type", "level", "lang",
-        "snippet", "pattern", "term_or_phrase",
-        "rule_id", "score", "page", "method"
-    ]
-    # defaults para o legado
-    defaults = {
-        "match_type": "term",
-        "level": 1,
-        "lang": None,
-        "pattern": None,
-        "term_or_phrase": None,
-        "rule_id": None,
-        "score": None,
-        "page": None,
-        "method": "lexical",
-    }
-    for k, v in defaults.items():
-        if k not in df.columns:
-            df[k] = v
-
-    # tipos básicos
-    if "concept_id" in df.columns:
-        df["concept_id"] = pd.to_numeric(df["concept_id"], errors="coerce").astype("Int64")
-    if "level" in df.columns:
-        df["level"] = pd.to_numeric(df["level"], errors="coerce").fillna(1).astype(int)
-    if "page" in df.columns:
-        df["page"] = pd.to_numeric(df["page"], errors="coerce").astype("Int64")
-    if "score" in df.columns:
-        df["score"] = pd.to_numeric(df["score"], errors="coerce")
-
-    # ordena/filtra colunas
-    for col in required:
-        if col not in df.columns:
-            df[col] = None
-    df = df[required]
-
-    # dedupe lógico igual ao seu índice (doc_name, concept_id, md5(snippet))
-    df = df.drop_duplicates(subset=["doc_name", "concept_id", "snippet"], keep="first")
-    if df.empty:
-        return 0
-
-    insert_evidences_df(df)  # já faz ON CONFLICT DO NOTHING
-    return int(df.shape[0])
+# process_doc concluídos numa janela de N s viram uma única atualização do índice
+MEILI_COALESCE_SECONDS = float(os.getenv("MEILI_COALESCE_SECONDS", "5"))
+PENDING_DOCS_KEY = "equiframe:meili:pending_docs"
+FLUSH_SCHEDULED_KEY = "equiframe:meili:flush_scheduled"
 
 @shared_task(name="app.search.reindex")
-def reindex_meili():
-    from app.search.indexer import index_all
-    return index_all()
+def reindex_meili(mode: str = "delta"):
+    """delta (default): incremental pela marca d'água; full: rebuild com swap de índice."""
+    from app.search.indexer import reindex
+    return reindex(mode)
+
+def _redis():
+    from redis import Redis
+    return Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"))
+
+def schedule_doc_index(doc_name: str) -> None:
+    """Marca o documento para reindexar; agenda um flush só se não houver um pendente."""
+    r = _redis()
+    r.sadd(PENDING_DOCS_KEY, doc_name)
+    # a chave expira sozinha se o flush se perder
+    if r.set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=int(MEILI_COALESCE_SECONDS) + 60):
+        index_pending_docs.apply_async(countdown=MEILI_COALESCE_SECONDS)
+
+@shared_task(name="app.search.index_pending_docs")
+def index_pending_docs():
+    """Atualiza no índice todos os documentos acumulados desde o último flush."""
+    r = _redis()
+    r.delete(FLUSH_SCHEDULED_KEY)  # antes de ler: o que chegar depois agenda outro flush
+    with r.pipeline() as p:
+        p.smembers(PENDING_DOCS_KEY)
+        p.delete(PENDING_DOCS_KEY)
+        names, _ = p.execute()
+    from app.search.indexer import index_documents
+    return index_documents([n.decode("utf-8") for n in names])
+
+@shared_task(name="app.search.index_doc")
+def index_doc(doc_name: str):
+    from app.search.indexer import index_documents
+    return index_documents([doc_name])
+
+@shared_task(name="app.pipeline.tasks.apply_dictionary_delta")
+def apply_dictionary_delta():
+    """Re-casa só as sentenças afetadas pelo que mudou no dicionário (ver dict_delta)."""
+    from .dict_delta import apply_dictionary_delta as apply_delta
+    res = apply_delta()
+    logger.info("apply_dictionary_delta | %s", res)
+    if REINDEX_AFTER and (res.get("evidences_added") or res.get("evidences_removed")):
+        reindex_meili.apply_async()
+    return res
 
 @shared_task(name="app.pipeline.tasks.process_doc")
-def process_doc(doc_id: int):
+def process_doc(doc_id: int, nlp_profile: str | None = None, force: bool = False,
+                claim: str | None = None):
+    """
+    nlp_profile (full | fast | regex) sobrepõe NLP_PROFILE só para este documento.
+    force=True ignora o que já foi processado para o mesmo (sha256, perfil, dicionário).
+    claim: token de quem reservou o documento (process_batch), que o repassa a esta task.
+    """
     if PIPELINE_IMPL != "v2":
         return {"impl": "legacy", "error": "process_doc só disponível com PIPELINE_IMPL=v2"}
 
-    logger.info("process_doc START doc_id=%s", doc_id)
-    from .v2 import process_doc as process_doc_v2
+    logger.info("process_doc START doc_id=%s nlp_profile=%s force=%s", doc_id, nlp_profile, force)
+    from .v2 import Lease, LeaseLost, mark_processed, process_doc as process_doc_v2
+    # disparo direto (rota) também precisa do lease: não processa doc que outro worker segura
+    lease = Lease(doc_id)
+    if not lease.acquire(claim):
+        logger.info("process_doc BUSY doc_id=%s (lease de outro worker)", doc_id)
+        return {"impl": "v2", "doc_id": doc_id, "busy": True}
     try:
-        res = process_doc_v2(doc_id)  # ex.: {'doc_id': 1, 'sentences': 415, 'evidences': 403}
-
-        # (opcional) marca no DB o status e as contagens
-        with engine.begin() as conn:
-            conn.execute(text("""
-                UPDATE documents
-                   SET status = 'processed',
-                       sentence_count = :sentences,
-                       evidence_count = :evidences,
-                       processed_at = now()
-                 WHERE id = :doc_id
-            """), res)
+        res = process_doc_v2(doc_id, nlp_profile=nlp_profile, force=force, lease=lease)
+        # ex.: {'doc_id': 1, 'sentences': 415, 'evidences': 403, 'skipped': ['extract']}
+        mark_processed(res, lease.who)
 
         logger.info("process_doc DONE doc_id=%s | %s", doc_id, res)
-        if REINDEX_AFTER:
-            reindex_meili.apply_async()
+        if REINDEX_AFTER and "match" not in res.get("skipped", ()):
+            with engine.begin() as conn:
+                doc_name = conn.execute(text("SELECT doc_name FROM documents WHERE id = :id"),
+                                        {"id": doc_id}).scalar_one()
+            schedule_doc_index(doc_name)
         return {"impl": "v2", **res}
 
+    except LeaseLost:
+        # outro worker assumiu o documento; o status agora é dele
+        logger.warning("process_doc LEASE LOST doc_id=%s", doc_id)
+        return {"impl": "v2", "doc_id": doc_id, "lease_lost": True}
+
     except Exception as e:
         logger.exception("process_doc ERROR doc_id=%s", doc_id)
         # (opcional) grava erro no documento
@@ -108,39 +107,34 @@ def process_doc(doc_id: int):
                 UPDATE documents
                    SET status = 'error',
                        last_error = :err,
+                       lease_expires_at = NULL,
                        updated_at = now()
-                 WHERE id = :doc_id
-            """), {"err": str(e), "doc_id": doc_id})
+                 WHERE id = :doc_id AND claimed_by = :who
+            """), {"err": str(e), "doc_id": doc_id, "who": lease.who})
         raise
 
 @shared_task(name="app.pipeline.tasks.process_batch")
 def process_batch():
     """
-    LEGADO (default): roda run_pilot() -> lê /data/output/evidences.csv -> insere.
-    V2: extrai, tokeniza, casa com dicionário e insere direto no Postgres.
+    LEGADO (default): run_pilot() casa os arquivos novos/alterados de /data/input e grava
+        as evidências direto no Postgres (CSV/JSONL só com PILOT_EXPORT=true).
+    V2: reserva até BATCH_LIMIT documentos (SKIP LOCKED + lease) e dispara um
+        process_doc por documento num group; vários workers drenam a fila em paralelo.
     """
     if PIPELINE_IMPL == "legacy":
-        res = run_pilot()  # mantém seu fluxo atual
-        inserted = 0
-        if os.path.exists(OUTPUT_CSV):
-            try:
-                df = pd.read_csv(OUTPUT_CSV)
-                if not df.empty:
-                    inserted = _insert_df_with_defaults(df)
-            except Exception:
-                inserted = 0
-        out = {
-            "impl": "legacy",
-            "output_csv": OUTPUT_CSV,
-            "output_jsonl": OUTPUT_JSONL,
-            "inserted": inserted,
-        }
-        if isinstance(res, dict):
-            out.update(res)
+        # incremental: só arquivos novos/alterados, evidências direto no Postgres
+        res = run_pilot()
+        out = {"impl": "legacy", **res}
     else:
-        from .v2 import process_batch as process_batch_v2
-        results = process_batch_v2(limit=BATCH_LIMIT)
-        out = {"impl": "v2", "results": results}
+        from .v2 import claim_documents, claim_token
+        who = claim_token()
+        doc_ids = claim_documents(limit=BATCH_LIMIT, who=who)
+        out = {"impl": "v2", "claimed": doc_ids, "group_id": None}
+        if doc_ids:
+            res = group(process_doc.s(did, claim=who) for did in doc_ids).apply_async()
+            out["group_id"] = res.id
+        # reindex fica a cargo de cada process_doc
+        return out
 
     if REINDEX_AFTER:
         reindex_meili.apply_async()
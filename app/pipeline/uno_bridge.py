@@ -0,0 +1,70 @@
+# app/pipeline/uno_bridge.py
+"""
+Ponte UNO usada por office.SofficeConverter.
+
+Roda com o python que tem o módulo uno (python3-uno do sistema), não com o da
+aplicação, e por isso só usa a biblioteca padrão. Conecta no soffice que o worker
+deixou escutando na porta dada e converte um arquivo por pedido (uma linha JSON
+no stdin, uma linha JSON de resposta no stdout):
+
+    {"src": "/data/x.doc", "dst": "/tmp/x.txt"}  ->  {"ok": true} | {"ok": false, "error": "..."}
+
+    python3 uno_bridge.py PORTA TIMEOUT_CONEXAO
+"""
+import json, sys, time
+
+import uno
+from com.sun.star.beans import PropertyValue
+
+
+def _props(**kw):
+    out = []
+    for k, v in kw.items():
+        p = PropertyValue()
+        p.Name, p.Value = k, v
+        out.append(p)
+    return tuple(out)
+
+
+def connect(port: int, timeout: float):
+    local = uno.getComponentContext()
+    resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            ctx = resolver.resolve(f"uno:socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext")
+            return ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.25)  # soffice ainda subindo
+
+
+def convert(desktop, src: str, dst: str) -> None:
+    doc = desktop.loadComponentFromURL(uno.systemPathToFileUrl(src), "_blank", 0,
+                                       _props(Hidden=True, ReadOnly=True))
+    if doc is None:
+        raise RuntimeError("LibreOffice não abriu o arquivo")
+    try:
+        doc.storeToURL(uno.systemPathToFileUrl(dst),
+                       _props(FilterName="Text (encoded)", FilterOptions="UTF8"))
+    finally:
+        doc.close(True)
+
+
+def main():
+    port, timeout = int(sys.argv[1]), float(sys.argv[2])
+    desktop = connect(port, timeout)
+    print(json.dumps({"ready": True}), flush=True)
+    for line in sys.stdin:
+        req = json.loads(line)
+        try:
+            convert(desktop, req["src"], req["dst"])
+            out = {"ok": True}
+        except Exception as e:
+            out = {"ok": False, "error": str(e)}
+        print(json.dumps(out), flush=True)
+
+
+if __name__ == "__main__":
+    main()
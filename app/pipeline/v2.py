@@ -1,45 +1,168 @@
 # app/pipeline/v2.py
-import hashlib
+import hashlib, os, socket, time, uuid
+from itertools import islice
+from pathlib import Path
 from sqlalchemy import text
-from app.db import engine
+from app.db import engine, copy_rows, merge_evidences
 
-from .pdf import extract_pages_text
-from .nlp import page_to_sentences
-from .dict_repo import load_dictionary
-from .matcher import match_sentence
+from .pdf import iter_pages_text
+from .ocr import with_ocr
+from .office import OFFICE_SUFFIXES, iter_pages_office
+from .nlp import pages_to_sentences, resolve_profile
+from .dict_repo import get_dictionary
+from .matcher import match_document
+from . import semantic
 
-def _md5(s: str) -> str:
+# 'stream': página -> sentenças -> matches -> banco em lotes, numa passada só;
+# 'two_phase': grava todas as sentenças e depois relê para casar (re-matching)
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "stream").lower()
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "2000"))
+
+# lease de um documento reservado por claim_documents (depois disso outro worker pode retomá-lo);
+# renovado entre as etapas enquanto o documento está sendo processado
+DOC_LEASE_SECONDS = int(os.getenv("DOC_LEASE_SECONDS", "1800"))
+
+# ingestão de sentenças: 'copy' (COPY FROM STDIN) ou 'executemany', em lotes
+SENTENCE_INSERT_MODE = os.getenv("SENTENCE_INSERT_MODE", "copy").lower()
+SENTENCE_BATCH_SIZE = int(os.getenv("SENTENCE_BATCH_SIZE", "5000"))
+SENTENCE_COLUMNS = ("doc_id", "doc_name", "page", "sent_idx", "lang", "text", "lemma_text")
+
+def snippet_md5(s: str) -> str:
+    """Mesmo valor de md5(snippet) no Postgres."""
     return hashlib.md5(s.encode("utf-8"), usedforsecurity=False).hexdigest()
 
-def extract_pdf_to_sentences(doc_id: int) -> int:
+def _batched(it, n: int):
+    it = iter(it)
+    while batch := list(islice(it, n)):
+        yield batch
+
+def _sentence_row(doc, s) -> tuple:
+    return (doc["id"], doc["doc_name"], int(s["page"]), s["sent_idx"],
+            doc["lang"] or None, s["text"], s["lemma_text"])
+
+def _doc_pages(doc):
+    """
+    Páginas do documento em ordem. PDF: com OCR nas que não têm camada de texto;
+    .docx/.odt/.rtf/.doc: blocos de texto extraídos em processo (ver office).
+    """
+    path = doc["file_path"]
+    if Path(path).suffix.lower() in OFFICE_SUFFIXES:
+        return iter_pages_office(path)
+    return with_ocr(iter_pages_text(path), path, doc["sha256"], doc["lang"])
+
+def _write_sentences(conn, rows: list[tuple]) -> int:
+    """Grava um lote de sentenças (COPY por padrão; executemany como alternativa)."""
+    if not rows:
+        return 0
+    if SENTENCE_INSERT_MODE == "copy":
+        return copy_rows(conn, "sentences", SENTENCE_COLUMNS, rows)
+    conn.execute(text("""
+        INSERT INTO sentences (doc_id, doc_name, page, sent_idx, lang, text, lemma_text)
+        VALUES (:doc_id, :doc_name, :page, :sent_idx, :lang, :text, :lemma_text)
+    """), [dict(zip(SENTENCE_COLUMNS, r)) for r in rows])
+    return len(rows)
+
+def evidence_row(doc, s, m) -> tuple:
+    """Linha de evidences (ordem de EVIDENCE_COLUMNS) para o match m da sentença s."""
+    return (
+        doc["doc_name"], int(m["concept_id"]), m["method"], int(m["level"]), doc["lang"],
+        s["text"], m["pattern_str"], m["term_or_phrase"], m["rule_id"],
+        float(m["score"]) if m["score"] is not None else None,
+        int(s["page"]) if s["page"] is not None else None,
+        m["method"],
+    )
+
+def match_sentences(sents, lang: str, dct) -> dict:
+    """{sentence_id: [matches]}: léxico/regras + (opcional) recall semântico."""
+    by_sent = match_document(sents, lang, dct)
+    if semantic.SEMANTIC_ENABLED:
+        # recall semântico: só conceitos que o léxico não achou na sentença
+        covered = {sid: {m["concept_id"] for m in ms} for sid, ms in by_sent.items()}
+        for sid, ms in semantic.semantic_matches(sents, dct, skip=covered).items():
+            by_sent[sid].extend(ms)
+    return by_sent
+
+def claim_token() -> str:
+    """Identifica quem segura um lease (documents.claimed_by)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class LeaseLost(RuntimeError):
+    """Outro worker assumiu o documento (lease vencido e reservado de novo)."""
+
+class Lease:
+    """Lease de um documento: quem o segura e a renovação entre etapas."""
+
+    def __init__(self, doc_id: int, who: str | None = None, seconds: int | None = None):
+        self.doc_id = doc_id
+        self.who = who or claim_token()
+        self.seconds = seconds or DOC_LEASE_SECONDS
+        self.renewed = time.monotonic()
+
+    def acquire(self, claim: str | None = None) -> bool:
+        """
+        Reserva o documento se ninguém o segura (ou o lease venceu). `claim` é o dono
+        atual quando ele repassa o documento (process_batch -> process_doc).
+        """
+        with engine.begin() as conn:
+            got = conn.execute(text("""
+                UPDATE documents
+                   SET status = 'processing',
+                       lease_expires_at = now() + make_interval(secs => :lease),
+                       claimed_by = :who,
+                       updated_at = now()
+                 WHERE id = :id
+                   AND (status <> 'processing' OR lease_expires_at < now() OR claimed_by = :claim)
+                RETURNING id
+            """), {"id": self.doc_id, "lease": self.seconds, "who": self.who, "claim": claim}).first()
+        self.renewed = time.monotonic()
+        return got is not None
+
+    def renew(self, force: bool = False) -> None:
+        """Estende o lease (no máximo a cada 1/3 da duração); LeaseLost se não é mais nosso."""
+        if not force and time.monotonic() - self.renewed < self.seconds / 3:
+            return
+        with engine.begin() as conn:
+            got = conn.execute(text("""
+                UPDATE documents SET lease_expires_at = now() + make_interval(secs => :lease)
+                 WHERE id = :id AND claimed_by = :who AND status = 'processing'
+                RETURNING id
+            """), {"id": self.doc_id, "lease": self.seconds, "who": self.who}).first()
+        if got is None:
+            raise LeaseLost(f"document {self.doc_id}: lease não pertence mais a {self.who}")
+        self.renewed = time.monotonic()
+
+def _renew(lease: Lease | None) -> None:
+    if lease is not None:
+        lease.renew()
+
+def extract_pdf_to_sentences(doc_id: int, nlp_profile: str | None = None,
+                             lease: Lease | None = None) -> int:
     """Extrai texto página a página e salva na tabela sentences (recria do doc)."""
     with engine.begin() as conn:
         row = conn.execute(
-            text("SELECT id, doc_name, file_path, lang FROM documents WHERE id=:id"),
+            text("SELECT id, doc_name, file_path, sha256, lang FROM documents WHERE id=:id"),
             {"id": doc_id},
         ).mappings().first()
         if not row:
             raise ValueError(f"document {doc_id} not found")
-        pages = extract_pages_text(row["file_path"])
+        pages = _doc_pages(row)
 
         conn.execute(text("DELETE FROM sentences WHERE doc_id=:id"), {"id": doc_id})
-        total = 0
-        for p in pages:
-            sents = page_to_sentences(p["text"], row["lang"] or "en")
-            for i, s in enumerate(sents):
-                conn.execute(text("""
-                    INSERT INTO sentences (doc_id, doc_name, page, sent_idx, lang, text, lemma_text)
-                    VALUES (:doc_id, :doc_name, :page, :sent_idx, :lang, :text, :lemma_text)
-                """), dict(
-                    doc_id=row["id"], doc_name=row["doc_name"], page=int(p["page"]), sent_idx=i,
-                    lang=row["lang"] or None, text=s["text"], lemma_text=s["lemma_text"]
-                ))
-                total += 1
-        conn.execute(text("UPDATE documents SET status='parsed' WHERE id=:id"), {"id": doc_id})
+        total, batch = 0, []
+        for s in pages_to_sentences(pages, row["lang"] or "en", profile=nlp_profile):
+            batch.append(_sentence_row(row, s))
+            if len(batch) >= SENTENCE_BATCH_SIZE:
+                total += _write_sentences(conn, batch)
+                batch = []
+                _renew(lease)
+        total += _write_sentences(conn, batch)
+        # 'processing' (reservado por um worker) só sai do estado quando o doc termina
+        conn.execute(text("UPDATE documents SET status='parsed' WHERE id=:id AND status <> 'processing'"),
+                     {"id": doc_id})
         return total
 
-def generate_evidences_for_doc(doc_id: int) -> int:
-    dct = load_dictionary()
+def generate_evidences_for_doc(doc_id: int, dct=None) -> int:
+    dct = dct or get_dictionary()
     with engine.begin() as conn:
         doc = conn.execute(
             text("SELECT id, doc_name, lang FROM documents WHERE id=:id"),
@@ -53,47 +176,151 @@ def generate_evidences_for_doc(doc_id: int) -> int:
             WHERE doc_id=:id ORDER BY page, sent_idx
         """), {"id": doc_id}).mappings().all()
 
-        added = 0
-        for s in sents:
-            matches = match_sentence(s["text"], s["lemma_text"] or "", doc["lang"] or "en", dct)
-            for m in matches:
-                conn.execute(text("""
-                    INSERT INTO evidences
-                        (doc_name, concept_id, match_type, level, lang,
-                         snippet, pattern, term_or_phrase, rule_id, score, page, method, created_at)
-                    VALUES
-                        (:doc_name, :concept_id, :match_type, :level, :lang,
-                         :snippet, :pattern, :term_or_phrase, :rule_id, :score, :page, :method, now())
-                    ON CONFLICT (doc_name, concept_id, md5(snippet)) DO NOTHING
-                """), dict(
-                    doc_name=doc["doc_name"],
-                    concept_id=int(m["concept_id"]),
-                    match_type=m["method"],
-                    level=int(m["level"]),
-                    lang=doc["lang"],
-                    snippet=s["text"],
-                    pattern=m["pattern_str"],
-                    term_or_phrase=m["term_or_phrase"],
-                    rule_id=m["rule_id"],
-                    score=float(m["score"]) if m["score"] is not None else None,
-                    page=int(s["page"]) if s["page"] is not None else None,
-                    method=m["method"],
-                ))
-                added += 1
-        return added
-
-def process_doc(doc_id: int) -> dict:
-    n_sent = extract_pdf_to_sentences(doc_id)
-    n_evd  = generate_evidences_for_doc(doc_id)
+        by_sent = match_sentences(sents, doc["lang"] or "en", dct)
+        rows = [
+            evidence_row(doc, s, m)
+            for s in sents for m in by_sent[s["id"]]
+        ]
+        return merge_evidences(conn, rows)
+
+def process_doc_streaming(doc_id: int, nlp_profile: str | None = None, dct=None,
+                          lease: Lease | None = None) -> dict:
+    """
+    Uma passada: cada lote de STREAM_BATCH_SIZE sentenças é gravado e casado na hora,
+    sem reler sentences do banco. A memória não cresce com o tamanho do documento.
+    """
+    dct = dct or get_dictionary()
+    with engine.begin() as conn:
+        doc = conn.execute(
+            text("SELECT id, doc_name, file_path, sha256, lang FROM documents WHERE id=:id"),
+            {"id": doc_id},
+        ).mappings().first()
+        if not doc:
+            raise ValueError(f"document {doc_id} not found")
+        lang = doc["lang"] or "en"
+
+        conn.execute(text("DELETE FROM sentences WHERE doc_id=:id"), {"id": doc_id})
+        n_sent = n_evd = 0
+        stream = pages_to_sentences(_doc_pages(doc), lang, profile=nlp_profile)
+        for batch in _batched(stream, STREAM_BATCH_SIZE):
+            for i, s in enumerate(batch):
+                s["id"] = n_sent + i  # id local ao lote; sentences.id não é usado nas evidências
+            n_sent += _write_sentences(conn, [_sentence_row(doc, s) for s in batch])
+            by_sent = match_sentences(batch, lang, dct)
+            n_evd += merge_evidences(conn, [
+                evidence_row(doc, s, m) for s in batch for m in by_sent[s["id"]]
+            ])
+            _renew(lease)
+        # 'processing' (reservado por um worker) só sai do estado quando o doc termina
+        conn.execute(text("UPDATE documents SET status='parsed' WHERE id=:id AND status <> 'processing'"),
+                     {"id": doc_id})
     return {"doc_id": doc_id, "sentences": n_sent, "evidences": n_evd}
 
-def process_batch(limit: int = 10) -> list[dict]:
-    out = []
+def _mark_stages(doc_id: int, **cols) -> None:
+    """Grava em documents as entradas que produziram sentenças/evidências."""
+    sets = ", ".join(f"{k} = :{k}" for k in cols)
     with engine.begin() as conn:
-        docs = conn.execute(text("""
-          SELECT id FROM documents
-          WHERE status IN ('uploaded','parsed') ORDER BY updated_at DESC LIMIT :lim
-        """), {"lim": limit}).scalars().all()
-    for did in docs:
-        out.append(process_doc(did))
+        conn.execute(text(f"UPDATE documents SET {sets} WHERE id=:id"), {"id": doc_id, **cols})
+
+def process_doc(doc_id: int, nlp_profile: str | None = None, mode: str | None = None,
+                force: bool = False, lease: Lease | None = None) -> dict:
+    """
+    mode: 'stream' | 'two_phase' (default PIPELINE_MODE).
+    lease: se dado, é renovado entre as etapas (e entre lotes); LeaseLost se outro
+    worker assumiu o documento.
+
+    Endereçamento por conteúdo: sentenças dependem de (sha256, perfil de NLP) e
+    evidências também da versão do dicionário. Etapas cujas entradas não mudaram
+    desde a última execução são puladas (force=True refaz tudo); o resultado lista
+    as puladas em 'skipped'.
+    """
+    profile = resolve_profile(nlp_profile)
+    dct = get_dictionary()
+    with engine.begin() as conn:
+        doc = conn.execute(text("""
+            SELECT sha256, parsed_sha256, parsed_nlp_profile, matched_dict_version,
+                   sentence_count, evidence_count
+            FROM documents WHERE id=:id
+        """), {"id": doc_id}).mappings().first()
+        if not doc:
+            raise ValueError(f"document {doc_id} not found")
+        parsed = (not force and doc["sha256"] is not None
+                  and doc["parsed_sha256"] == doc["sha256"] and doc["parsed_nlp_profile"] == profile)
+        n_sent = conn.execute(text("SELECT count(*) FROM sentences WHERE doc_id=:id"),
+                              {"id": doc_id}).scalar_one() if parsed else 0
+
+    if parsed and doc["matched_dict_version"] == dct["version"]:
+        return {"doc_id": doc_id, "sentences": n_sent, "evidences": doc["evidence_count"] or 0,
+                "skipped": ["extract", "match"]}
+    _renew(lease)
+    if parsed:
+        n_evd = generate_evidences_for_doc(doc_id, dct)
+        _renew(lease)
+        _mark_stages(doc_id, matched_dict_version=dct["version"])
+        # evidências só se acumulam (ON CONFLICT DO NOTHING): total = anteriores + novas
+        return {"doc_id": doc_id, "sentences": n_sent, "evidences": (doc["evidence_count"] or 0) + n_evd,
+                "skipped": ["extract"]}
+
+    if (mode or PIPELINE_MODE) == "stream":
+        res = process_doc_streaming(doc_id, nlp_profile=profile, dct=dct, lease=lease)
+        _mark_stages(doc_id, parsed_sha256=doc["sha256"], parsed_nlp_profile=profile,
+                     matched_dict_version=dct["version"])
+        return {**res, "skipped": []}
+    n_sent = extract_pdf_to_sentences(doc_id, nlp_profile=profile, lease=lease)
+    _mark_stages(doc_id, parsed_sha256=doc["sha256"], parsed_nlp_profile=profile,
+                 matched_dict_version=None)
+    _renew(lease)
+    n_evd  = generate_evidences_for_doc(doc_id, dct)
+    _renew(lease)
+    _mark_stages(doc_id, matched_dict_version=dct["version"])
+    return {"doc_id": doc_id, "sentences": n_sent, "evidences": n_evd, "skipped": []}
+
+def claim_documents(limit: int = 10, lease_seconds: int | None = None,
+                    who: str | None = None) -> list[int]:
+    """
+    Reserva até `limit` documentos pendentes (ou com lease vencido) em nome de `who`
+    (claim_token()). FOR UPDATE SKIP LOCKED: workers concorrentes nunca pegam o mesmo
+    documento.
+    """
+    with engine.begin() as conn:
+        return conn.execute(text("""
+            WITH picked AS (
+                SELECT id FROM documents
+                WHERE status IN ('uploaded','parsed')
+                   OR (status = 'processing' AND lease_expires_at < now())
+                ORDER BY updated_at DESC
+                LIMIT :lim
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE documents d
+               SET status = 'processing',
+                   lease_expires_at = now() + make_interval(secs => :lease),
+                   claimed_by = :who,
+                   updated_at = now()
+              FROM picked
+             WHERE d.id = picked.id
+            RETURNING d.id
+        """), {"lim": limit, "lease": lease_seconds or DOC_LEASE_SECONDS,
+               "who": who or claim_token()}).scalars().all()
+
+def mark_processed(res: dict, who: str | None = None) -> None:
+    """Fecha o documento: status 'processed', contagens e fim do lease (só se ainda é de `who`)."""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE documents
+               SET status = 'processed',
+                   sentence_count = :sentences,
+                   evidence_count = :evidences,
+                   processed_at = now(),
+                   lease_expires_at = NULL
+             WHERE id = :doc_id AND (CAST(:who AS text) IS NULL OR claimed_by = :who)
+        """), {**res, "who": who})
+
+def process_batch(limit: int = 10) -> list[dict]:
+    """Processa em sequência, neste processo, os documentos reservados (uso fora do Celery)."""
+    out, who = [], claim_token()
+    for did in claim_documents(limit, who=who):
+        res = process_doc(did, lease=Lease(did, who))
+        mark_processed(res, who)
+        out.append(res)
     return out
@@ -0,0 +1,34 @@
+# app/schema.py
+"""
+Aplica ef_schema_pipeline.sql (tabelas, índices e triggers da pipeline v2).
+O arquivo é idempotente; roda a cada subida da api/worker, sob um advisory lock
+para que dois containers subindo juntos não apliquem ao mesmo tempo.
+
+    python -m app.schema
+"""
+import os
+from pathlib import Path
+
+from sqlalchemy import text
+
+from app.db import engine
+
+SCHEMA_FILES = [Path(p) for p in os.getenv(
+    "SCHEMA_FILES", str(Path(__file__).resolve().parent.parent / "ef_schema_pipeline.sql")).split(os.pathsep)]
+SCHEMA_LOCK_KEY = 0x45465343  # "EFSC"
+
+def apply_schema() -> list[str]:
+    applied = []
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": SCHEMA_LOCK_KEY})
+        cur = conn.connection.cursor()
+        try:
+            for path in SCHEMA_FILES:
+                cur.execute(path.read_text(encoding="utf-8"))  # vários comandos e corpos $$: direto no driver
+                applied.append(path.name)
+        finally:
+            cur.close()
+    return applied
+
+if __name__ == "__main__":
+    print({"schema": apply_schema()})
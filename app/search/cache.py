@@ -0,0 +1,99 @@
+# app/search/cache.py
+"""
+Cache de respostas de busca/facetas da API (LRU + TTL, por processo).
+
+A chave inclui a versão do índice: cada atualização do índice (indexer) incrementa
+um contador no Redis; quando a API vê uma versão nova, o cache é esvaziado.
+"""
+import os, threading, time
+from collections import OrderedDict
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+INDEX_VERSION_CHECK = float(os.getenv("INDEX_VERSION_CHECK", "1"))   # s entre leituras da versão no Redis
+INDEX_VERSION_KEY = "equiframe:meili:index_version"
+
+_redis = None
+
+def _get_redis():
+    global _redis
+    if _redis is None:
+        from redis import Redis
+        _redis = Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"),
+                                socket_timeout=0.5, socket_connect_timeout=0.5)
+    return _redis
+
+def bump_index_version() -> None:
+    """Chamado pelo indexer ao terminar uma atualização do índice."""
+    try:
+        _get_redis().incr(INDEX_VERSION_KEY)
+    except Exception:
+        pass  # sem Redis o cache ainda expira pelo TTL
+
+class SearchCache:
+    def __init__(self, maxsize: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        self.version = None
+        self.version_checked = 0.0
+
+    def index_version(self) -> str:
+        now = time.monotonic()
+        if self.version is not None and now - self.version_checked < INDEX_VERSION_CHECK:
+            return self.version
+        try:
+            v = (_get_redis().get(INDEX_VERSION_KEY) or b"0").decode()
+        except Exception:
+            v = self.version or "0"
+        with self.lock:
+            if v != self.version:
+                if self.version is not None:
+                    self.invalidations += 1
+                self.data.clear()
+                self.version = v
+            self.version_checked = now
+        return v
+
+    def get(self, key) -> tuple:
+        """(versão do índice consultada, valor ou None); a versão volta para put()."""
+        version = self.index_version()
+        key = (version, *key)
+        now = time.monotonic()
+        with self.lock:
+            item = self.data.get(key)
+            if item is not None and item[0] > now:
+                self.data.move_to_end(key)
+                self.hits += 1
+                return version, item[1]
+            if item is not None:
+                del self.data[key]
+            self.misses += 1
+            return version, None
+
+    def put(self, key, value, version: str) -> None:
+        """Guarda sob a versão vista no get(); se o índice mudou no meio, descarta."""
+        with self.lock:
+            if version != self.version:
+                return
+            key = (version, *key)
+            self.data[key] = (time.monotonic() + self.ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.data), "maxsize": self.maxsize, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions, "invalidations": self.invalidations,
+                "index_version": self.version,
+            }
+
+search_cache = SearchCache()
@@ -2,8 +2,10 @@
 
 from meilisearch import Client, errors as meili_err
 from app.db import engine
+from app.search.cache import bump_index_version
 from sqlalchemy import text
-import os, time, math
+import json, os, math
+from collections import deque
 
 MEILI_URL = os.getenv("MEILI_URL", "http://meili:7700")
 MEILI_KEY = os.getenv("MEILI_MASTER_KEY")
@@ -45,42 +47,196 @@ def _clean_doc(d):
             except Exception: d[k] = 0
     return d
 
-def index_all(batch_size=200):
+SETTINGS = {
+    "searchableAttributes": ["snippet", "pattern", "term_or_phrase", "doc_name"],
+    "filterableAttributes": ["doc_name", "concept_id", "lang"],
+}
+SHADOW_NAME = f"{INDEX_NAME}__shadow"
+# ids alocados por transações que ainda não tinham commitado na última rodada
+# podem ficar abaixo da marca d'água: o delta reenvia essa janela (upsert é idempotente)
+MEILI_DELTA_OVERLAP = int(os.getenv("MEILI_DELTA_OVERLAP", "5000"))
+# o mesmo vale para evidence_tombstones.seq: remoções commitadas depois da rodada
+# com seq abaixo da marca são relidas nessa janela (apagar de novo é inofensivo)
+MEILI_TOMBSTONE_OVERLAP = int(os.getenv("MEILI_TOMBSTONE_OVERLAP", "5000"))
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", "7"))
+
+# envio em streaming: cursor no servidor -> payloads NDJSON grandes -> poucas tasks em voo
+MEILI_FETCH_SIZE = int(os.getenv("MEILI_FETCH_SIZE", "5000"))            # linhas por fetch do cursor
+MEILI_PAYLOAD_BYTES = int(os.getenv("MEILI_PAYLOAD_BYTES", str(8 << 20)))  # teto de cada add_documents
+MEILI_MAX_INFLIGHT = int(os.getenv("MEILI_MAX_INFLIGHT", "4"))           # tasks enfileiradas sem esperar
+MEILI_POLL_MS = int(os.getenv("MEILI_POLL_MS", "500"))
+MEILI_WAIT_MS = int(os.getenv("MEILI_WAIT_MS", "1800000"))              # espera final de um envio grande
+
+SQL_ROWS = """
+    SELECT id, doc_name, concept_id, match_type, level, lang, snippet, pattern, term_or_phrase
+    FROM evidences
+"""
+
+# -------- marca d'água (search_index_state) --------
+def _marks(conn) -> dict:
+    """Topo atual de evidences.id e de evidence_tombstones.seq (tirado antes de ler as linhas)."""
+    return conn.execute(text("""
+        SELECT (SELECT COALESCE(max(id), 0) FROM evidences) AS last_id,
+               (SELECT COALESCE(max(seq), 0) FROM evidence_tombstones) AS last_tombstone
+    """)).mappings().one()
+
+def _get_state(conn):
+    return conn.execute(text("""
+        SELECT last_id, last_tombstone FROM search_index_state WHERE index_name = :n
+    """), {"n": INDEX_NAME}).mappings().first()
+
+def _set_state(conn, marks) -> None:
+    conn.execute(text("""
+        INSERT INTO search_index_state (index_name, last_id, last_tombstone, updated_at)
+        VALUES (:n, :last_id, :last_tombstone, now())
+        ON CONFLICT (index_name) DO UPDATE
+          SET last_id = EXCLUDED.last_id, last_tombstone = EXCLUDED.last_tombstone, updated_at = now()
+    """), {"n": INDEX_NAME, **marks})
+
+# -------- envio --------
+def _prepare(client: Client, name: str):
+    r = client.create_index(name, {"primaryKey": "id"})
+    _wait(client, r)
+    idx = client.index(name)
+    _wait(client, idx.update_settings(SETTINGS))
+    return idx
+
+def _ndjson_payloads(rows, max_bytes: int):
+    """Agrupa as linhas em payloads NDJSON de até ~max_bytes. Gera (bytes, n_docs)."""
+    buf, size, n = [], 0, 0
+    for r in rows:
+        line = json.dumps(_clean_doc(dict(r)), ensure_ascii=False).encode("utf-8")
+        if buf and size + len(line) + 1 > max_bytes:
+            yield b"\n".join(buf), n
+            buf, size, n = [], 0, 0
+        buf.append(line)
+        size += len(line) + 1
+        n += 1
+    if buf:
+        yield b"\n".join(buf), n
+
+def _push(client: Client, idx, rows, max_bytes: int | None = None) -> int:
+    """
+    Envia `rows` (iterável, lido sob demanda) em payloads NDJSON, com no máximo
+    MEILI_MAX_INFLIGHT tasks pendentes; só bloqueia quando a janela enche e no fim.
+    """
+    inflight, uids, sent = deque(), [], 0
+    for payload, n in _ndjson_payloads(rows, max_bytes or MEILI_PAYLOAD_BYTES):
+        t = idx.add_documents_ndjson(payload, primary_key="id")  # upsert por id
+        uid = _task_uid(t)
+        inflight.append(t)
+        uids.append(uid)
+        sent += n
+        if len(inflight) > MEILI_MAX_INFLIGHT:
+            _wait(client, inflight.popleft(), timeout_ms=MEILI_WAIT_MS, interval_ms=MEILI_POLL_MS)
+    # tasks do mesmo índice rodam em ordem: esperar a última cobre todas
+    if inflight:
+        _wait(client, inflight[-1], timeout_ms=MEILI_WAIT_MS, interval_ms=MEILI_POLL_MS)
+    failed = [u for u in uids if u is not None and _task_status(client, u) != "succeeded"]
+    if failed:
+        raise RuntimeError(f"Meili rejeitou {len(failed)} lote(s): tasks {failed[:10]}")
+    return sent
+
+def _task_status(client: Client, uid):
+    t = client.get_task(uid)
+    return t.get("status") if isinstance(t, dict) else getattr(t, "status", None)
+
+def _stream(conn, sql: str, params: dict | None = None):
+    """Linhas via cursor do lado do servidor (memória constante)."""
+    return conn.execution_options(stream_results=True, yield_per=MEILI_FETCH_SIZE) \
+               .execute(text(sql), params or {}).mappings()
+
+def index_all():
+    """
+    Rebuild completo sem derrubar a busca: monta um índice sombra, troca com o
+    atual (swap atômico do Meili) e apaga o antigo.
+    """
     client = Client(MEILI_URL, MEILI_KEY)
+    try:
+        client.index(SHADOW_NAME).delete()  # sobra de um rebuild interrompido
+    except Exception:
+        pass
+    try:
+        client.get_index(INDEX_NAME)
+    except meili_err.MeilisearchApiError:
+        _prepare(client, INDEX_NAME)  # swap exige que os dois índices existam
+    shadow = _prepare(client, SHADOW_NAME)
+
+    with engine.begin() as conn:
+        marks = dict(_marks(conn))
+        sent = _push(client, shadow, _stream(conn, SQL_ROWS))
 
-    # (re)cria índice com primaryKey=id
+    swap = _wait(client, client.swap_indexes([{"indexes": [INDEX_NAME, SHADOW_NAME]}]))
+    if swap["status"] != "succeeded":
+        return {"mode": "full", "sent": sent, "status": swap["status"]}
     try:
-        client.index(INDEX_NAME).delete()
+        client.index(SHADOW_NAME).delete()  # depois do swap, é o índice antigo
     except Exception:
         pass
-    r = client.create_index(INDEX_NAME, {"primaryKey": "id"})
-    _wait(client, r)
+    with engine.begin() as conn:
+        _set_state(conn, marks)
+    bump_index_version()  # invalida o cache de busca da API
+    return {"mode": "full", "sent": sent, "status": "ok"}
 
+def index_delta():
+    """
+    Incremental: envia as evidências acima da marca d'água e apaga do índice os ids
+    removidos (evidence_tombstones, preenchida por trigger). Sem estado: rebuild completo.
+    """
+    client = Client(MEILI_URL, MEILI_KEY)
     idx = client.index(INDEX_NAME)
-    r = idx.update_settings({
-        "searchableAttributes": ["snippet", "pattern", "term_or_phrase", "doc_name"],
-        "filterableAttributes": ["doc_name", "concept_id", "lang"],
-    })
-    _wait(client, r)
-
     with engine.begin() as conn:
-        rows = conn.execute(text("""
-            SELECT id, doc_name, concept_id, match_type, level, lang, snippet, pattern, term_or_phrase
-            FROM evidences
-        """)).mappings().all()
+        state = _get_state(conn)
+        if state is None:
+            return index_all()
+        marks = dict(_marks(conn))
+        sent = _push(client, idx, _stream(conn, SQL_ROWS + " WHERE id > :since ORDER BY id",
+                                          {"since": max(0, state["last_id"] - MEILI_DELTA_OVERLAP)}))
+        gone = conn.execute(text("""
+            SELECT DISTINCT evidence_id FROM evidence_tombstones WHERE seq > :since
+        """), {"since": max(0, state["last_tombstone"] - MEILI_TOMBSTONE_OVERLAP)}).scalars().all()
+    if gone:
+        _wait(client, idx.delete_documents([int(i) for i in gone]), interval_ms=MEILI_POLL_MS)
 
-    docs = [_clean_doc(dict(r)) for r in rows]
-    if not docs:
-        return {"sent": 0, "status": "ok", "note": "no rows"}
+    with engine.begin() as conn:
+        _set_state(conn, marks)
+        conn.execute(text("""
+            DELETE FROM evidence_tombstones
+            WHERE seq <= :seq AND deleted_at < now() - make_interval(days => :days)
+        """), {"seq": marks["last_tombstone"], "days": TOMBSTONE_RETENTION_DAYS})
+    bump_index_version()
+    return {"mode": "delta", "sent": sent, "deleted": len(gone), "status": "ok"}
 
-    sent = 0
-    for i in range(0, len(docs), batch_size):
-        chunk = docs[i:i+batch_size]
-        t = idx.add_documents(chunk)  # upsert por id
-        _wait(client, t)
-        sent += len(chunk)
+def index_documents(doc_names: list[str]):
+    """
+    Atualiza só as evidências dos documentos dados: apaga do índice tudo o que é
+    desses doc_name (filtro) e envia as linhas atuais. As tasks do índice rodam em
+    ordem, então o envio nunca é apagado pela remoção.
+    """
+    doc_names = sorted(set(doc_names))
+    if not doc_names:
+        return {"mode": "docs", "docs": 0, "sent": 0, "status": "ok"}
+    client = Client(MEILI_URL, MEILI_KEY)
+    try:
+        client.get_index(INDEX_NAME)
+    except meili_err.MeilisearchApiError:
+        return index_all()  # índice ainda não existe: cria completo
+    idx = client.index(INDEX_NAME)
+    idx.delete_documents(filter="doc_name IN [" + ", ".join(json.dumps(n) for n in doc_names) + "]")
+    with engine.begin() as conn:
+        sent = _push(client, idx, _stream(conn, SQL_ROWS + " WHERE doc_name = ANY(:names)",
+                                          {"names": doc_names}))
+    bump_index_version()
+    return {"mode": "docs", "docs": len(doc_names), "sent": sent, "status": "ok"}
 
-    return {"sent": sent, "status": "ok"}
+def reindex(mode: str = "delta"):
+    """mode: 'delta' (incremental) | 'full' (rebuild com swap)."""
+    if mode == "full":
+        return index_all()
+    if mode == "delta":
+        return index_delta()
+    raise ValueError(f"modo de reindex inválido: {mode}")
 
 if __name__ == "__main__":
-    print(index_all())
+    import sys
+    print(reindex(sys.argv[1] if len(sys.argv) > 1 else "full"))
@@ -1,7 +1,64 @@
 from meilisearch import Client
-import os
+import os, threading
+import httpx
 
 MEILI_URL = os.getenv("MEILI_URL", "http://meili:7700")
 MEILI_KEY = os.getenv("MEILI_MASTER_KEY", None)
+MEILI_HTTP_TIMEOUT = float(os.getenv("MEILI_HTTP_TIMEOUT", "10"))
+MEILI_POOL_SIZE = int(os.getenv("MEILI_POOL_SIZE", "20"))   # conexões keep-alive por processo
 
 client = Client(MEILI_URL, MEILI_KEY)
+
+def get_client() -> Client:
+    """Client do SDK (operações administrativas), um por processo."""
+    return client
+
+# buscas: o SDK abre uma conexão nova a cada request; aqui um pool keep-alive por processo
+_http = None
+_http_lock = threading.Lock()
+
+def _headers() -> dict:
+    return {"Authorization": f"Bearer {MEILI_KEY}"} if MEILI_KEY else {}
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=MEILI_POOL_SIZE, max_keepalive_connections=MEILI_POOL_SIZE)
+
+def get_http() -> httpx.Client:
+    global _http
+    if _http is None:
+        with _http_lock:
+            if _http is None:
+                _http = httpx.Client(base_url=MEILI_URL, headers=_headers(),
+                                     timeout=MEILI_HTTP_TIMEOUT, limits=_limits())
+    return _http
+
+def search(index: str, q: str, payload: dict) -> dict:
+    """POST /indexes/{index}/search pelo pool (mesmo corpo que Index.search do SDK)."""
+    r = get_http().post(f"/indexes/{index}/search", json={"q": q, **payload})
+    r.raise_for_status()
+    return r.json()
+
+# versão assíncrona para os endpoints async da API (um pool por processo/loop)
+_ahttp = None
+
+def get_async_http() -> httpx.AsyncClient:
+    global _ahttp
+    if _ahttp is None:
+        _ahttp = httpx.AsyncClient(base_url=MEILI_URL, headers=_headers(),
+                                   timeout=MEILI_HTTP_TIMEOUT, limits=_limits())
+    return _ahttp
+
+async def multi_search(queries: list[dict]) -> list[dict]:
+    """POST /multi-search: várias buscas numa só ida ao Meili; resultados na ordem das queries."""
+    r = await get_async_http().post("/multi-search", json={"queries": queries})
+    r.raise_for_status()
+    return r.json()["results"]
+
+async def aclose() -> None:
+    global _http, _ahttp
+    if _ahttp is not None:
+        await _ahttp.aclose()
+        _ahttp = None
+    if _http is not None:
+        _http.close()
+        _http = None
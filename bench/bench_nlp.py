@@ -0,0 +1,66 @@
+# bench/bench_nlp.py
+"""
+Compara os perfis de NLP (full / fast / regex): sentenças/s e concordância de lemas.
+
+    python -m bench.bench_nlp /data/input/loaded/politica.pdf --lang pt
+    python -m bench.bench_nlp texto.txt --lang en --pages 50
+
+A concordância é medida por token: fração dos tokens do perfil 'full' que aparecem
+no outro perfil com o mesmo trecho (página, offset, tamanho) e o mesmo lema.
+"""
+import argparse, time
+from pathlib import Path
+
+from app.pipeline.nlp import NLP_PROFILES, get_nlp
+
+
+def load_pages(path: str, limit: int | None) -> list[dict]:
+    if path.lower().endswith(".pdf"):
+        from app.pipeline.pdf import extract_pages_text
+        pages = extract_pages_text(path)
+    else:
+        # texto puro: cada bloco separado por linha em branco dupla vira uma "página"
+        blocks = Path(path).read_text(encoding="utf-8", errors="ignore").split("\n\n\n")
+        pages = [{"page": i, "text": b} for i, b in enumerate(blocks, start=1)]
+    return pages[:limit] if limit else pages
+
+
+def run(profile: str, pages: list[dict], lang: str, batch_size: int):
+    nlp = get_nlp(lang, profile)
+    lemmas, n_sents = {}, 0
+    t0 = time.perf_counter()
+    for doc, page in nlp.pipe(((p["text"], p["page"]) for p in pages), as_tuples=True, batch_size=batch_size):
+        n_sents += sum(1 for s in doc.sents if s.text.strip())
+        for t in doc:
+            if not t.is_space:
+                lemmas[(page, t.idx, len(t))] = (t.lemma_ if profile != "regex" else t.text).lower()
+    return time.perf_counter() - t0, n_sents, lemmas
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("path")
+    ap.add_argument("--lang", default="pt")
+    ap.add_argument("--pages", type=int, default=None)
+    ap.add_argument("--batch-size", type=int, default=16)
+    args = ap.parse_args()
+
+    pages = load_pages(args.path, args.pages)
+    print(f"pages={len(pages)} chars={sum(len(p['text']) for p in pages)} lang={args.lang}")
+
+    base = None
+    for profile in NLP_PROFILES:
+        t_load = time.perf_counter()
+        get_nlp(args.lang, profile)
+        t_load = time.perf_counter() - t_load
+        secs, n_sents, lemmas = run(profile, pages, args.lang, args.batch_size)
+        if base is None:
+            base = lemmas
+        same = sum(1 for k, v in base.items() if lemmas.get(k) == v)
+        agree = same / len(base) if base else 1.0
+        print(f"{profile:6s} load={t_load:6.2f}s parse={secs:7.2f}s sentences={n_sents:7d} "
+              f"{n_sents / secs if secs else 0:9.1f} sent/s  lemma_agreement={agree:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# bench/bench_pdf.py
+"""
+Extração de páginas: sequencial x fatiada em processos (iter_pages_text).
+
+    python -m bench.bench_pdf /data/input/loaded/relatorio.pdf --workers 4
+    python -m bench.bench_pdf --synthetic 600 --workers 4
+
+--synthetic N gera um PDF com N páginas misturando texto e páginas "escaneadas"
+(só imagem, sem camada de texto), o caso típico de relatórios grandes.
+"""
+import argparse, os, tempfile, time
+
+import fitz
+
+from app.pipeline.pdf import _extract_range, iter_pages_text, page_count
+
+
+def synthetic(n_pages: int, path: str) -> str:
+    doc = fitz.open()
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 1240, 1754), False)
+    pix.clear_with(200)
+    for i in range(n_pages):
+        page = doc.new_page()
+        if i % 4 == 3:
+            page.insert_image(page.rect, pixmap=pix)
+            continue
+        y = 40
+        for j in range(45):
+            page.insert_text((40, y), f"Página {i + 1}, linha {j}: política de desenvolvimento sustentável e metas.", fontsize=9)
+            y += 16
+    doc.save(path)
+    return path
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("pdf", nargs="?")
+    ap.add_argument("--synthetic", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--shard", type=int, default=None)
+    args = ap.parse_args()
+
+    path = args.pdf
+    if not path:
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        synthetic(args.synthetic or 600, path)
+    n = page_count(path)
+
+    t0 = time.perf_counter()
+    seq = _extract_range(path, 0, n)
+    t_seq = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    first = None
+    par = []
+    for p in iter_pages_text(path, workers=args.workers, shard_pages=args.shard):
+        if first is None:
+            first = time.perf_counter() - t0
+        par.append(p)
+    t_par = time.perf_counter() - t0
+
+    assert par == seq, "extração paralela divergiu da sequencial"
+    print(f"pages={n} workers={args.workers}")
+    print(f"sequential: {t_seq:8.3f}s  {n / t_seq:10.1f} pages/s")
+    print(f"parallel  : {t_par:8.3f}s  {n / t_par:10.1f} pages/s  (1ª página em {first:.3f}s)")
+    print(f"speedup   : {t_seq / t_par:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# bench/bench_rules.py
+"""
+Compara o laço regra a regra (pattern.search em todas) com o RuleSet compilado.
+
+    python -m bench.bench_rules --rules 3000 --sentences 2000
+"""
+import argparse, random, re, string, time
+
+from app.pipeline.rules import RuleSet
+
+SHAPES = [
+    r"\b{w}\b",
+    r"\b{w}\s+\w+",
+    r"(?:{w}|{v})\w*",
+    r"\b{p}\w*\s+(de|da|do)\b",
+    r"(?<!não\s){w}",
+]
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase + "áçãéİı") for _ in range(rng.randint(4, 10)))
+
+
+def build(n_rules: int, n_sents: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocab = [_word(rng) for _ in range(n_rules * 2)] + ["de", "da", "do", "não"]
+    rules = []
+    for i in range(n_rules):
+        w, v = vocab[i], vocab[n_rules + i]
+        pat = rng.choice(SHAPES).format(w=w, v=v, p=w[:4])
+        rules.append({"id": i, "pattern": re.compile(pat, flags=re.I | re.M)})
+    sents = [" ".join(rng.choice(vocab) for _ in range(rng.randint(8, 40))) for _ in range(n_sents)]
+    return rules, sents
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rules", type=int, default=3000)
+    ap.add_argument("--sentences", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rules, sents = build(args.rules, args.sentences, args.seed)
+
+    t0 = time.perf_counter()
+    loop = [[i for i, r in enumerate(rules) if r["pattern"].search(s)] for s in sents]
+    t_loop = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    rs = RuleSet(rules)
+    t_build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    comp = [rs.fired(s) for s in sents]
+    t_set = time.perf_counter() - t0
+
+    assert comp == loop, "RuleSet divergiu do laço"
+    fired = sum(map(len, loop))
+    print(f"rules={len(rules)} sentences={len(sents)} fired={fired} prefiltered={len(rules) - len(rs.always)}")
+    print(f"loop    : {t_loop:8.3f}s  {len(sents) / t_loop:10.1f} sent/s")
+    print(f"ruleset : {t_set:8.3f}s  {len(sents) / t_set:10.1f} sent/s  (build {t_build:.3f}s)")
+    print(f"speedup : {t_loop / t_set:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# bench/bench_search.py
+"""
+Latência por consulta do dashboard: /api/search + /api/search/facets (duas chamadas,
+uma depois da outra) x /api/search/combined (uma chamada, um /multi-search no Meili).
+
+    python -m bench.bench_search --api http://localhost:8000 --rounds 20
+    python -m bench.bench_search --queries "água,saúde,gênero" --lang pt
+
+Suba a API com SEARCH_CACHE_SIZE=0 para medir o Meili e não o cache de respostas.
+"""
+import argparse, statistics, time
+
+import httpx
+
+DEFAULT_QUERIES = [
+    "política", "gênero", "saúde", "educação", "água", "clima", "renda", "moradia",
+    "equity", "gender", "health", "education", "climate", "income", "housing", "poverty",
+]
+
+
+def _pct(xs: list[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))]
+
+
+def two_calls(http: httpx.Client, params: dict) -> None:
+    http.get("/api/search", params=params).raise_for_status()
+    http.get("/api/search/facets", params={"q": params["q"]}).raise_for_status()
+
+
+def combined(http: httpx.Client, params: dict) -> None:
+    http.get("/api/search/combined", params=params).raise_for_status()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--api", default="http://localhost:8000")
+    ap.add_argument("--queries", default=",".join(DEFAULT_QUERIES))
+    ap.add_argument("--rounds", type=int, default=20)
+    ap.add_argument("--limit", type=int, default=20)
+    ap.add_argument("--lang", default=None)
+    args = ap.parse_args()
+
+    queries = [q.strip() for q in args.queries.split(",") if q.strip()]
+    flows = {"two-call": two_calls, "combined": combined}
+    times = {name: [] for name in flows}
+    with httpx.Client(base_url=args.api, timeout=30) as http:
+        stats = http.get("/api/search/cache/stats").json()
+        if stats.get("maxsize"):
+            print(f"aviso: cache de busca ligado na API (maxsize={stats['maxsize']}); use SEARCH_CACHE_SIZE=0")
+        for q in queries[:2]:  # aquecimento (conexões, páginas do índice)
+            for fn in flows.values():
+                fn(http, {"q": q, "limit": args.limit})
+        for r in range(args.rounds):
+            for i, q in enumerate(queries):
+                params = {"q": q, "limit": args.limit}
+                if args.lang:
+                    params["lang"] = args.lang
+                order = list(flows.items())
+                if (r + i) % 2:
+                    order.reverse()  # alterna a ordem para não favorecer um dos fluxos
+                for name, fn in order:
+                    t0 = time.perf_counter()
+                    fn(http, params)
+                    times[name].append((time.perf_counter() - t0) * 1000)
+
+    n = len(times["combined"])
+    print(f"queries={len(queries)} rounds={args.rounds} samples={n}")
+    for name, xs in times.items():
+        print(f"{name:9s}: p50 {_pct(xs, 50):7.2f} ms  p95 {_pct(xs, 95):7.2f} ms  mean {statistics.fmean(xs):7.2f} ms")
+    print(f"p50 speedup: {_pct(times['two-call'], 50) / _pct(times['combined'], 50):5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+-- Estruturas auxiliares da pipeline v2 (idempotente: pode rodar de novo a cada deploy)
+
+-- cache de embeddings de sentenças: (modelo, md5 do texto normalizado) -> vetor float32
+CREATE TABLE IF NOT EXISTS sentence_embeddings (
+  model      text        NOT NULL,
+  text_md5   char(32)    NOT NULL,
+  dim        int         NOT NULL,
+  vec        bytea       NOT NULL,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (model, text_md5)
+);
+
+-- OCR por página: (sha256 do PDF, página, DPI, idioma do Tesseract) -> texto
+CREATE TABLE IF NOT EXISTS page_ocr_cache (
+  sha256     char(64)    NOT NULL,
+  page       int         NOT NULL,
+  dpi        int         NOT NULL,
+  ocr_lang   text        NOT NULL,
+  text       text        NOT NULL,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (sha256, page, dpi, ocr_lang)
+);
+
+-- entradas que produziram as sentenças/evidências atuais (process_doc pula etapas inalteradas)
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS parsed_sha256        text;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS parsed_nlp_profile   text;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS matched_dict_version text;
+
+-- re-matching incremental (app/pipeline/dict_delta.py)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS sentences_text_trgm  ON sentences USING gin (text gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS sentences_lemma_trgm ON sentences USING gin (lemma_text gin_trgm_ops);
+-- filtro do fuzzy no delta: textos mais curtos que o termo sempre são candidatos
+CREATE INDEX IF NOT EXISTS sentences_text_len ON sentences (char_length(text));
+
+-- entradas do dicionário já aplicadas ao corpus (md5 de cada linha)
+CREATE TABLE IF NOT EXISTS dictionary_entries_applied (
+  kind      text     NOT NULL,  -- term | phrase | rule
+  entry_key text     NOT NULL,  -- conceito|idioma|termo, conceito|idioma|frase ou id da regra
+  entry_md5 char(32) NOT NULL,
+  lang      text,
+  value     text,
+  lemma     text,
+  PRIMARY KEY (kind, entry_md5)
+);
+
+CREATE TABLE IF NOT EXISTS dictionary_sync_state (
+  id         int PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  version    text        NOT NULL,
+  applied_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- reserva de documentos por worker (v2.claim_documents: SKIP LOCKED + lease)
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS lease_expires_at timestamptz;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS claimed_by       text;
+CREATE INDEX IF NOT EXISTS documents_status_idx ON documents (status, updated_at DESC);
+
+-- manifesto do piloto legado: arquivos de /data/input já casados
+CREATE TABLE IF NOT EXISTS pilot_manifest (
+  path         text             PRIMARY KEY,
+  size         bigint           NOT NULL,
+  mtime        double precision NOT NULL,
+  sha256       char(64)         NOT NULL,
+  dict_key     char(32)         NOT NULL,
+  evidences    int              NOT NULL DEFAULT 0,
+  processed_at timestamptz      NOT NULL DEFAULT now()
+);
+
+-- indexação incremental do Meili (app/search/indexer.py)
+CREATE TABLE IF NOT EXISTS search_index_state (
+  index_name     text        PRIMARY KEY,
+  last_id        bigint      NOT NULL,  -- maior evidences.id já enviado
+  last_tombstone bigint      NOT NULL,  -- maior evidence_tombstones.seq já aplicado
+  updated_at     timestamptz NOT NULL DEFAULT now()
+);
+
+-- ids apagados de evidences, para o delta removê-los do índice
+CREATE TABLE IF NOT EXISTS evidence_tombstones (
+  seq         bigserial   PRIMARY KEY,
+  evidence_id bigint      NOT NULL,
+  deleted_at  timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION evidences_tombstone() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+  INSERT INTO evidence_tombstones (evidence_id) SELECT id FROM old_rows;
+  RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS evidences_tombstone ON evidences;
+CREATE TRIGGER evidences_tombstone AFTER DELETE ON evidences
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION evidences_tombstone();
+
+-- versão publicada do dicionário (app/pipeline/dict_repo.py): o hash do conteúdo é
+-- recalculado só quando lexicon_terms/key_phrases/pattern_rules/concepts são escritas, e os
+-- workers comparam contra esta linha em vez de agregar as três tabelas a cada checagem
+CREATE OR REPLACE FUNCTION dictionary_content_hash() RETURNS text LANGUAGE sql STABLE AS $$
+  SELECT md5(concat_ws('|',
+    (SELECT md5(COALESCE(string_agg(t::text, E'\n' ORDER BY t::text), '')) FROM lexicon_terms t),
+    (SELECT md5(COALESCE(string_agg(k::text, E'\n' ORDER BY k::text), '')) FROM key_phrases k),
+    (SELECT md5(COALESCE(string_agg(r::text, E'\n' ORDER BY r::text), '')) FROM pattern_rules r),
+    -- nomes/definições dos conceitos viram protótipos do estágio semântico
+    (SELECT md5(COALESCE(string_agg(c::text, E'\n' ORDER BY c::text), '')) FROM concepts c)
+  ))
+$$;
+
+CREATE TABLE IF NOT EXISTS dictionary_version (
+  id         int         PRIMARY KEY CHECK (id = 1),
+  version    text        NOT NULL,
+  updated_at timestamptz NOT NULL DEFAULT now()
+);
+INSERT INTO dictionary_version (id, version) SELECT 1, dictionary_content_hash()
+ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version, updated_at = now()
+WHERE dictionary_version.version IS DISTINCT FROM EXCLUDED.version;
+
+-- o hash lê as quatro tabelas inteiras: calculado uma vez por transação, no commit.
+-- O trigger de comando só marca a linha (uma vez por transação, guarda em set_config);
+-- a marcação dispara o constraint trigger adiado que recalcula a versão.
+ALTER TABLE dictionary_version ADD COLUMN IF NOT EXISTS dirty boolean NOT NULL DEFAULT false;
+
+CREATE OR REPLACE FUNCTION dictionary_version_refresh() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+  IF current_setting('equiframe.dictionary_dirty', true) = 'on' THEN
+    RETURN NULL;  -- já marcada nesta transação (executemany: um comando por linha)
+  END IF;
+  -- a trava da linha serializa escritores concorrentes até o commit: o hash adiado
+  -- já enxerga o que o outro commitou
+  UPDATE dictionary_version SET dirty = true WHERE id = 1;
+  PERFORM set_config('equiframe.dictionary_dirty', 'on', true);
+  RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION dictionary_version_publish() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+  UPDATE dictionary_version SET version = h, dirty = false,
+         updated_at = CASE WHEN version IS DISTINCT FROM h THEN now() ELSE updated_at END
+  FROM (SELECT dictionary_content_hash() AS h) x
+  WHERE id = 1;
+  RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS dictionary_version_publish ON dictionary_version;
+CREATE CONSTRAINT TRIGGER dictionary_version_publish AFTER UPDATE ON dictionary_version
+  DEFERRABLE INITIALLY DEFERRED
+  FOR EACH ROW WHEN (NEW.dirty AND NOT OLD.dirty) EXECUTE FUNCTION dictionary_version_publish();
+
+DROP TRIGGER IF EXISTS lexicon_terms_dictionary_version ON lexicon_terms;
+CREATE TRIGGER lexicon_terms_dictionary_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON lexicon_terms
+  FOR EACH STATEMENT EXECUTE FUNCTION dictionary_version_refresh();
+DROP TRIGGER IF EXISTS key_phrases_dictionary_version ON key_phrases;
+CREATE TRIGGER key_phrases_dictionary_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON key_phrases
+  FOR EACH STATEMENT EXECUTE FUNCTION dictionary_version_refresh();
+DROP TRIGGER IF EXISTS pattern_rules_dictionary_version ON pattern_rules;
+CREATE TRIGGER pattern_rules_dictionary_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON pattern_rules
+  FOR EACH STATEMENT EXECUTE FUNCTION dictionary_version_refresh();
+DROP TRIGGER IF EXISTS concepts_dictionary_version ON concepts;
+CREATE TRIGGER concepts_dictionary_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON concepts
+  FOR EACH STATEMENT EXECUTE FUNCTION dictionary_version_refresh();
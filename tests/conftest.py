@@ -0,0 +1,7 @@
+# tests/conftest.py
+import os, sys
+from pathlib import Path
+
+# os testes não abrem conexão: só precisam que app.db consiga montar o engine
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,81 @@
+# tests/test_dict_delta.py
+from app.pipeline import dict_delta
+
+
+def _entry(kind, key, md5, value, lang="pt"):
+    return {"kind": kind, "entry_key": key, "entry_md5": md5, "lang": lang, "value": value, "lemma": None}
+
+
+class _Result:
+    def __init__(self, rows=(), scalar=None):
+        self.rows, self._scalar = list(rows), scalar
+
+    def mappings(self):
+        return iter(self.rows)
+
+    def scalar(self):
+        return self._scalar
+
+
+class FakeConn:
+    """Responde às consultas de _apply a partir de listas em memória."""
+
+    def __init__(self, applied, current, sentences, version="v1"):
+        self.applied, self.current, self.sentences, self.version = applied, current, sentences, version
+        self.updates = []
+
+    def execute(self, stmt, params=None):
+        sql = str(stmt)
+        if "FROM dictionary_sync_state" in sql:
+            return _Result(scalar=self.version)
+        if "FROM dictionary_entries_applied" in sql:
+            return _Result(self.applied)
+        if "FROM lexicon_terms" in sql:
+            return _Result(self.current)
+        if "FROM sentences s JOIN documents" in sql:
+            return _Result([s for s in self.sentences if s["id"] in params["ids"]])
+        if sql.lstrip().startswith("UPDATE documents"):
+            self.updates.append(params)
+            return _Result()
+        raise AssertionError(f"SQL inesperado: {sql}")
+
+
+def test_apply_runs_delta_over_affected_sentences(monkeypatch):
+    kept = _entry("term", "1|pt|dados", "a", "dados")
+    changed_old = _entry("phrase", "2|pt|dado pessoal", "b", "dado pessoal")
+    changed_new = _entry("phrase", "2|pt|dado pessoal", "b2", "dado pessoal")
+    removed = _entry("rule", "7", "c", r"\bsigilo\b")
+    added = _entry("term", "3|pt|consentimento", "d", "consentimento")
+    conn = FakeConn(
+        applied=[kept, changed_old, removed],
+        current=[kept, changed_new, added],
+        sentences=[
+            {"id": 10, "doc_id": 1, "page": 1, "text": "a", "lemma_text": "a", "doc_name": "A", "lang": "pt"},
+            {"id": 11, "doc_id": 2, "page": 1, "text": "b", "lemma_text": "b", "doc_name": "B", "lang": "pt"},
+        ],
+    )
+    touched, rematched, saved = [], [], []
+    monkeypatch.setattr(dict_delta, "affected_sentences",
+                        lambda c, entries: touched.extend(entries) or {10, 11})
+    monkeypatch.setattr(dict_delta, "rematch_sentences",
+                        lambda c, sents, dct: rematched.append([s["id"] for s in sents]) or (2, 1))
+    monkeypatch.setattr(dict_delta, "_save_applied",
+                        lambda c, entries, version: saved.append((sorted(entries), version)))
+
+    out = dict_delta._apply(conn, {"version": "v2"}, 0.0)
+
+    assert (out["added"], out["changed"], out["removed"]) == (1, 1, 1)
+    assert {e["entry_md5"] for e in touched} == {"b", "b2", "c", "d"}
+    assert sorted(rematched) == [[10], [11]]   # um lote por documento
+    assert (out["evidences_added"], out["evidences_removed"]) == (4, 2)
+    assert saved == [(["a", "b2", "d"], "v2")]
+    assert conn.updates == [{"new": "v2", "old": "v1"}]
+
+
+def test_apply_first_run_only_saves_baseline(monkeypatch):
+    conn = FakeConn(applied=[], current=[_entry("term", "1|pt|dados", "a", "dados")], sentences=[], version=None)
+    saved = []
+    monkeypatch.setattr(dict_delta, "_save_applied", lambda c, entries, version: saved.append(version))
+    out = dict_delta._apply(conn, {"version": "v1"}, 0.0)
+    assert out == {"baseline": True, "to_version": "v1", "entries": 1}
+    assert saved == ["v1"]
@@ -0,0 +1,38 @@
+# tests/test_rules.py
+import re
+
+import pytest
+
+from app.pipeline.rules import RuleSet, fold, required_factors
+from bench.bench_rules import build
+
+
+def _loop(rules, text):
+    return [i for i, r in enumerate(rules) if r["pattern"].search(text)]
+
+
+def test_ruleset_matches_rule_by_rule_loop():
+    rules, sents = build(300, 300)
+    rs = RuleSet(rules)
+    assert [rs.fired(s) for s in sents] == [_loop(rules, s) for s in sents]
+
+
+@pytest.mark.parametrize("pattern, text", [
+    ("İstanbul", "istanbul"),
+    ("istanbul", "İSTANBUL"),
+    ("İzmir", "IZMIR"),
+    ("ınternet", "INTERNET"),
+    ("straße", "STRAẞE"),
+    ("ﬁnal", "ﬁnal"),
+    ("Σοφία", "σοφίας"),
+])
+def test_ruleset_casefold_edge_cases(pattern, text):
+    rules = [{"pattern": re.compile(pattern, flags=re.I | re.M)}]
+    assert _loop(rules, text) == [0]
+    assert RuleSet(rules).fired(text) == [0]
+
+
+def test_factors_skip_length_changing_folds():
+    assert required_factors(re.compile(r"\bstraße\b", re.I)) is None
+    assert required_factors(re.compile(r"\bİstanbul\b", re.I)) == {"istanbul"}
+    assert len(fold("İ")) == 1